@@ -1,5 +1,6 @@
-from dotenv import load_dotenv
-
+import queue
+import logging
+from logging.handlers import QueueHandler, QueueListener
 from math_agent import MathReasoningWorkflow
 
 
@@ -14,11 +15,22 @@ Find $m+n$.
 """
 
 
+def setup_logging(level=logging.INFO):
+    """
+    Route log records through a queue, so emitting them never blocks on stdout.
+
+    Returns:
+        The started listener, which writes the records from its own thread
+    """
+    log_queue = queue.Queue()
+    listener = QueueListener(log_queue, logging.StreamHandler())
+    logging.basicConfig(level=level, handlers=[QueueHandler(log_queue)])
+    listener.start()
+    return listener
+
+
 def main():
     """Run the math agent."""
-    # load environment variables
-    load_dotenv(override=True)
-
     # Create the workflow
     workflow = MathReasoningWorkflow(
         model_name="deepseek-chat",
@@ -37,4 +49,8 @@ if __name__ == "__main__":
     print("Math reasoning workflow usage examples")
     print("=" * 70)
 
-    main()
+    listener = setup_logging()
+    try:
+        main()
+    finally:
+        listener.stop()
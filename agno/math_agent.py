@@ -4,14 +4,32 @@ Math reasoning workflow based on Agno framework.
 
 import os
 import re
+import logging
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from typing import Iterator, Optional, List
 from dotenv import load_dotenv
 from pydantic import BaseModel
 from agno.agent import Agent, RunResponse
 from agno.models.deepseek import DeepSeek
 from agno.workflow import RunEvent, RunResponse, Workflow
-from utils import MathTools, get_calculator_tools
-from prompts import MathPromptTemplates, get_critic_prompt
+from utils import LLMCache, MathTools, get_calculator_tools
+from prompts import (
+    MathPromptTemplates,
+    format_problem,
+    get_critic_prompt,
+    get_selection_prompt,
+    get_verification_prompt,
+)
+
+# Load environment variables from .env file if exists
+load_dotenv(override=True)
+
+
+logger = logging.getLogger(__name__)
+
+_BEST_RE = re.compile(r"Solution\s+(\d+)\s+is the best", re.IGNORECASE)
+_VERIFIED_MARKER = "VERIFICATION: CORRECT"
 
 
 class MathWorkflowState(BaseModel):
@@ -32,7 +50,11 @@ class MathReasoningWorkflow(Workflow):
         api_base_url: Optional[str] = None,
         temperature: float = 1.0,
         token_limit: int = 8192,
+        selection_token_limit: int = 512,
+        verification_token_limit: int = 1024,
         selection_strategy: str = "agent",
+        sampling_strategy: str = "critic",
+        cache: Optional[LLMCache] = None,
         **kwargs,
     ):
         """
@@ -44,13 +66,14 @@ class MathReasoningWorkflow(Workflow):
             api_base_url: Base URL for API (will override .env if provided)
             temperature: Temperature for generation (default: 1.0)
             token_limit: Maximum token limit (default: 8192)
+            selection_token_limit: Maximum output tokens of the selection call (default: 512)
+            verification_token_limit: Maximum output tokens of a verification call (default: 1024)
             selection_strategy: Strategy for selecting the best solution ("agent", "last", "all")
+            sampling_strategy: Strategy for generating candidate solutions ("critic", "batch")
+            cache: Cache for LLM responses (default: an in-process LLMCache)
             **kwargs: Additional arguments
         """
         super().__init__(**kwargs)
-        
-        # Load environment variables from .env file if exists
-        load_dotenv(override=True)
 
         # Initialize API key and base URL variables
         self.api_key = (api_key if api_key else os.environ.get("DEEPSEEK_API_KEY"))
@@ -59,114 +82,283 @@ class MathReasoningWorkflow(Workflow):
         self.model_name = model_name
         self.temperature = temperature
         self.token_limit = token_limit
+        self.selection_token_limit = selection_token_limit
+        self.verification_token_limit = verification_token_limit
         self.selection_strategy = selection_strategy
+        self.sampling_strategy = sampling_strategy
+        self.cache = cache if cache is not None else LLMCache()
 
         # Initialize the reasoning agent
         self._initialize_agent()
 
     def _initialize_agent(self) -> None:
-        """Initialize the reasoning agent with model and tools."""
+        """Initialize the reasoning, selection and verification agents with model and tools."""
+        calculator_tools = get_calculator_tools()
+
+        # Create the reasoning agent
+        self.reasoner = self._create_agent("reasoner", self.token_limit, calculator_tools)
+
+        # Selection and verification only answer with a short verdict, so their
+        # output is capped well below the reasoning limit
+        self.selector = self._create_agent(
+            "selector", self.selection_token_limit, calculator_tools
+        )
+        self.verifier = self._create_agent(
+            "verifier", self.verification_token_limit, calculator_tools
+        )
+
+    def _create_agent(self, name: str, max_tokens: int, calculator_tools) -> Agent:
+        """
+        Create an agent on the DeepSeek model.
+
+        Args:
+            name: The role of the agent, which also tells its cached responses apart
+            max_tokens: Maximum output tokens of the agent
+            calculator_tools: The calculator tools available to the agent
+
+        Returns:
+            The created agent
+        """
         model_params = {
             "api_key": self.api_key,
             "base_url": self.api_base_url,
             "id": self.model_name,
             "temperature": self.temperature,
-            "max_tokens": self.token_limit,
+            "max_tokens": max_tokens,
         }
 
-        model = DeepSeek(**model_params)
-        calculator_tools = get_calculator_tools()
-
-        # Create the reasoning agent
-        self.reasoner = Agent(
-            model=model,
+        return Agent(
+            name=name,
+            model=DeepSeek(**model_params),
             introduction=MathPromptTemplates.SYSTEM_PROMPT,
             tools=[calculator_tools],
             show_tool_calls=True,
             markdown=True,
         )
 
+    def _cache_key(self, prompt: str, agent: Agent, stop_marker: Optional[str]) -> str:
+        """
+        Build the response cache key of a prompt for an agent and its settings.
+
+        The agent role, its output token cap and the stop marker are part of the
+        key, so a capped or early-stopped response is never served in place of
+        a full one.
+
+        Args:
+            prompt: The prompt to run
+            agent: The agent that runs the prompt
+            stop_marker: Optional text that ends generation as soon as it is streamed
+
+        Returns:
+            The cache key
+        """
+        parts = (
+            prompt,
+            self.model_name,
+            str(self.temperature),
+            agent.name,
+            str(agent.model.max_tokens),
+            stop_marker or "",
+        )
+        return hashlib.blake2b("\x00".join(parts).encode()).hexdigest()
+
+    def _run_reasoner(
+        self, prompt: str, stop_marker: Optional[str] = None, agent: Optional[Agent] = None
+    ) -> str:
+        """
+        Run an agent on a prompt, reusing a cached response if available.
+
+        Args:
+            prompt: The prompt to run
+            stop_marker: Optional text that ends generation as soon as it is streamed
+            agent: The agent to run (default: the reasoner)
+
+        Returns:
+            The response content
+        """
+        agent = agent if agent is not None else self.reasoner
+        key = self._cache_key(prompt, agent, stop_marker)
+        content = self.cache.lookup(key)
+        if content is None:
+            if stop_marker is None:
+                content = agent.run(prompt).content
+            else:
+                content = self._stream_until(agent, prompt, stop_marker)
+            self.cache.update(key, content)
+        return content
+
+    def _stream_until(self, agent: Agent, prompt: str, stop_marker: str) -> str:
+        """
+        Stream the agent response and stop once the marker has been generated.
+
+        Args:
+            agent: The agent to run
+            prompt: The prompt to run
+            stop_marker: Text that ends generation as soon as it is streamed
+
+        Returns:
+            The (possibly truncated) response content
+        """
+        content = ""
+        stream = agent.run(prompt, stream=True)
+        for chunk in stream:
+            if isinstance(chunk.content, str):
+                content += chunk.content
+                # The marker can only have been completed by the latest chunk
+                if stop_marker in content[-(len(chunk.content) + len(stop_marker)):]:
+                    # Closing the stream aborts the remaining generation
+                    stream.close()
+                    break
+        return content
+
     def run(self, problem: str, num_rounds: int = 3) -> Iterator[RunResponse]:
         """
         Execute the math reasoning workflow.
         """
-        # Initialize state
+        # Initialize state; it is stored once and then mutated in place
         state = MathWorkflowState(problem=problem)
         self.session_state[problem] = state
 
-        # Set state
-        state.answer_list = []
-        state.answer = None
-        self.session_state[problem] = state
-
-        # Multi-round reasoning
-        for round_idx in range(num_rounds):
-            if round_idx == 0:
-                # First round: just the problem with tools
-                problem_message = MathPromptTemplates.PROBLEM_FORMAT.format(
-                    problem=problem
-                )
-                response = self.reasoner.run(problem_message)
-                solution = response.content
-            else:
-                # Subsequent rounds: include previous solution with critique
-                critique_prompt = get_critic_prompt(
-                    problem=problem,
-                    previous_solution=state.answer,
-                    round_idx=round_idx,
+        if self.sampling_strategy == "batch":
+            # Independent samples of the problem, drawn in a single request
+            solutions = self._sample_solutions(problem, num_rounds)
+        else:
+            # First round: just the problem with tools
+            problem_message = format_problem(problem)
+            solutions = [self._run_reasoner(problem_message)]
+
+            # Subsequent rounds: critique the first-round solution concurrently
+            if num_rounds > 1:
+                solutions += self._critique_solution(
+                    problem, MathTools.extract_final_answer(solutions[0]), num_rounds
                 )
-                response = self.reasoner.run(critique_prompt)
-                solution = response.content
 
+        for round_idx, solution in enumerate(solutions):
             # Extract and update solution
             state.answer = MathTools.extract_final_answer(solution)
             state.answer_list.append(state.answer)
-            self.session_state[problem] = state
 
             yield RunResponse(
                 run_id=self.run_id,
-                content=f"Round {round_idx + 1} solution: {self.session_state[problem].answer}",
+                content=f"Round {round_idx + 1} solution: {state.answer}",
                 event=RunEvent.workflow_started
             )
 
         # Select final solution
         if self.selection_strategy == "last":
-            selected_solution = self.session_state[problem].answer_list[-1]
-        elif self.selection_strategy == "agent" and len(self.session_state[problem].answer_list) > 1:
-            selected_solution = self._select_solution(problem, self.session_state[problem].answer_list)
+            selected_solution = state.answer_list[-1]
+        elif self.selection_strategy == "agent":
+            # Identical answers need no selector call
+            unique_answers = list(dict.fromkeys(state.answer_list))
+            if len(unique_answers) > 1:
+                selected_solution = self._select_solution(problem, unique_answers)
+            else:
+                selected_solution = unique_answers[0]
         else:
-            selected_solution = "\n".join(self.session_state[problem].answer_list)
+            selected_solution = "\n".join(state.answer_list)
 
         # Verify and store solution
         state.answer = self._verify_solution(problem, selected_solution)
-        self.session_state[problem] = state
 
         yield RunResponse(
             run_id=self.run_id,
-            content=self.session_state[problem].answer,
+            content=state.answer,
             event=RunEvent.workflow_completed
         )
 
+    def _sample_solutions(self, problem: str, num_samples: int) -> List[str]:
+        """
+        Draw several independent solutions from a single request.
+
+        The OpenAI-compatible endpoint returns `n` samples for one prompt, so the
+        prompt is only sent and prefilled once. Endpoints that ignore `n`, such
+        as DeepSeek, return a single sample; the missing ones are then drawn
+        with concurrent single requests. This bypasses the agent and its
+        calculator tools.
+
+        Args:
+            problem: The original problem
+            num_samples: Number of solutions to sample
+
+        Returns:
+            The sampled solutions
+        """
+        client = self.reasoner.model.get_client()
+
+        def sample(n: int) -> List[str]:
+            response = client.chat.completions.create(
+                model=self.model_name,
+                messages=[
+                    {"role": "system", "content": MathPromptTemplates.SYSTEM_PROMPT},
+                    {
+                        "role": "user",
+                        "content": format_problem(problem),
+                    },
+                ],
+                n=n,
+                temperature=self.temperature,
+                max_tokens=self.token_limit,
+            )
+            return [choice.message.content for choice in response.choices]
+
+        solutions = sample(num_samples)
+        missing = num_samples - len(solutions)
+        if missing > 0:
+            with ThreadPoolExecutor(max_workers=missing) as executor:
+                for samples in executor.map(sample, [1] * missing):
+                    solutions += samples
+        return solutions
+
+    def _critique_solution(
+        self, problem: str, previous_solution: str, num_rounds: int
+    ) -> List[str]:
+        """
+        Run the critique rounds concurrently.
+
+        Every critique round only depends on the first-round solution, so the
+        requests are issued together from worker threads and the total wait is
+        bounded by the slowest one. Each round runs a copy of the reasoner,
+        because an agent keeps per-run state.
+
+        Args:
+            problem: The original problem
+            previous_solution: The first-round solution to critique
+            num_rounds: Total number of reasoning rounds
+
+        Returns:
+            The solutions of rounds 2..num_rounds, in round order
+        """
+        critique_prompts = [
+            get_critic_prompt(
+                problem=problem,
+                previous_solution=previous_solution,
+                round_idx=round_idx,
+            )
+            for round_idx in range(1, num_rounds)
+        ]
+        with ThreadPoolExecutor(max_workers=len(critique_prompts)) as executor:
+            return list(
+                executor.map(
+                    lambda prompt: self._run_reasoner(prompt, agent=self.reasoner.deep_copy()),
+                    critique_prompts,
+                )
+            )
+
     def _select_solution(self, problem: str, solutions: List[str]) -> str:
         """
         Select the best solution from multiple candidates.
         """
-        print("=====Selecting the best solution...=====")
+        logger.info("=====Selecting the best solution...=====")
 
         # Format solutions for the selector prompt
-        formatted_solutions = "\n\n".join(
-            [f"Solution {i + 1}:\n{solution}" for i, solution in enumerate(solutions)]
-        )
-        
-        selection_prompt = MathPromptTemplates.SELECTION_PROMPT.format(
-            problem=problem, solutions=formatted_solutions
-        )
+        formatted_solutions = MathTools.format_solutions(solutions)
 
-        response = self.reasoner.run(selection_prompt)
-        result = response.content
+        selection_prompt = get_selection_prompt(problem, formatted_solutions)
+
+        result = self._run_reasoner(selection_prompt, agent=self.selector)
 
         # Parse the result to find the selected solution
-        match = re.search(r"Solution\s+(\d+)\s+is the best", result, re.IGNORECASE)
+        match = _BEST_RE.search(result)
         
         if match:
             solution_idx = int(match.group(1)) - 1
@@ -190,30 +382,27 @@ class MathReasoningWorkflow(Workflow):
         Returns:
             The verified (and potentially corrected) solution
         """
-        print("=====Verifying the solution...=====")
+        logger.info("=====Verifying the solution...=====")
         current_solution = solution
 
         for attempt in range(max_attempts):
             # Run verification check
-            verification_prompt = MathPromptTemplates.VERIFICATION_PROMPT.format(
-                problem=problem, solution=current_solution
+            verification_prompt = get_verification_prompt(problem, current_solution)
+            verification_result = self._run_reasoner(
+                verification_prompt, stop_marker=_VERIFIED_MARKER, agent=self.verifier
             )
-            response = self.reasoner.run(verification_prompt)
-            verification_result = response.content
 
             # Check if verification was successful
-            if "VERIFICATION: CORRECT" in verification_result:
-                print(f"Solution verified as correct after {attempt + 1} attempts.")
+            if _VERIFIED_MARKER in verification_result:
+                logger.info("Solution verified as correct after %d attempts.", attempt + 1)
                 return current_solution
 
             # Extract revised solution if available
-            revised_match = re.search(
-                r"REVISED SOLUTION:(.*?)(?=$|VERIFICATION:)", verification_result, re.DOTALL
-            )
+            revised_solution = MathTools.extract_revised_solution(verification_result)
 
-            if revised_match:
-                current_solution = revised_match.group(1).strip()
-                print(f"Solution revised in attempt {attempt + 1}.")
+            if revised_solution:
+                current_solution = revised_solution
+                logger.info("Solution revised in attempt %d.", attempt + 1)
             else:
                 return f"{current_solution}\n\n===== VERIFICATION NOTES =====\n{verification_result}"
 
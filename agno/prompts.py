@@ -2,10 +2,13 @@
 Prompt templates.
 """
 
+from string import Formatter, Template
+from textwrap import dedent
+
 
 class MathPromptTemplates:
     # System prompt
-    SYSTEM_PROMPT = """
+    SYSTEM_PROMPT = dedent("""
             You are a mathematical deductive reasoner. You are tasked to solve challenging mathematical problems.
 
             ===== MODELING OF DEDUCTIVE REASONING =====
@@ -33,7 +36,7 @@ class MathPromptTemplates:
             [final answer]
 
             Return final answer within \\boxed{{}}
-            """
+            """).strip()
 
     # Problem format prompt
     PROBLEM_FORMAT = (
@@ -41,23 +44,28 @@ class MathPromptTemplates:
     )
 
     # Critic prompt
-    CRITIC_PROMPT = """
+    # Static instructions come first and the round-specific hint last, so every
+    # critique round of a problem shares the same prompt prefix and the
+    # provider's prefix cache can reuse it.
+    CRITIC_PROMPT = dedent("""
             You are a mathematical deductive reasoner with a critical eye. 
             Your task is to analyze a previous solution to a mathematical problem and find alternative approaches.
             Be creative, rigorous, and thorough in your reasoning. Show each step clearly.
 
-            ===== PREVIOUS SOLUTION =====
-            {previous_solution}
+            ===== OUTPUT =====
+            Return your final answer within \\boxed{{}}
 
             ===== ORIGINAL PROBLEM =====
             {problem}
 
-            ===== OUTPUT =====
-            Return your final answer within \\boxed{{}}
-            """
+            ===== PREVIOUS SOLUTION =====
+            {previous_solution}
+
+            {round_hint}
+            """).strip()
 
     # Solution prompt
-    SELECTION_PROMPT = """
+    SELECTION_PROMPT = dedent("""
             You are a mathematical solution evaluator. 
             Your task is to analyze multiple proposed solutions to a mathematical problem and select the most reliable one.
                     
@@ -75,10 +83,10 @@ class MathPromptTemplates:
 
             SELECTION:
             Solution [X] is the best.
-            """
+            """).strip()
 
     # Verification prompt
-    VERIFICATION_PROMPT = """
+    VERIFICATION_PROMPT = dedent("""
             You are a rigorous mathematical verification expert. 
             Your task is to verify a proposed solution to a mathematical problem with extreme thoroughness.
                     
@@ -91,18 +99,64 @@ class MathPromptTemplates:
             {solution}
 
             ===== OUTPUT FORMAT =====
-            - If correct: "Verification: CORRECT"
-            - If incorrect: "Verification: INCORRECT\nCorrected solution: [corrected solution]
-            """
+            VERIFICATION PROCESS:
+            [Detail your verification steps]
+
+            VERIFICATION RESULT:
+            [Either "VERIFICATION: CORRECT" or "VERIFICATION: INCORRECT"]
+
+            ISSUES FOUND:
+            [List any issues or errors]
+
+            REVISED SOLUTION:
+            [If incorrect, provide the corrected solution]
+            """).strip()
+
+
+def _to_template(format_string):
+    """
+    Convert a str.format template into a string.Template parsed once at import.
+
+    Args:
+        format_string: Template using {name} fields and {{ }} escapes
+
+    Returns:
+        The equivalent string.Template
+    """
+    parts = []
+    for literal, field, _, _ in Formatter().parse(format_string):
+        parts.append(literal.replace("$", "$$"))
+        if field is not None:
+            parts.append("${" + field + "}")
+    return Template("".join(parts))
+
+
+_PROBLEM_TEMPLATE = _to_template(MathPromptTemplates.PROBLEM_FORMAT)
+_CRITIC_TEMPLATE = _to_template(MathPromptTemplates.CRITIC_PROMPT)
+_SELECTION_TEMPLATE = _to_template(MathPromptTemplates.SELECTION_PROMPT)
+_VERIFICATION_TEMPLATE = _to_template(MathPromptTemplates.VERIFICATION_PROMPT)
+
+
+def format_problem(problem):
+    return _PROBLEM_TEMPLATE.substitute(problem=problem)
+
+
+def get_selection_prompt(problem, solutions):
+    return _SELECTION_TEMPLATE.substitute(problem=problem, solutions=solutions)
+
+
+def get_verification_prompt(problem, solution):
+    return _VERIFICATION_TEMPLATE.substitute(problem=problem, solution=solution)
 
 
 def get_critic_prompt(problem, previous_solution, round_idx):
     if round_idx == 1:
-        prefix = "The previous solution might contain errors or inefficiencies. "
+        round_hint = "The previous solution might contain errors or inefficiencies."
     elif round_idx == 2:
-        prefix = "The previous solution is likely flawed or suboptimal. Try a completely different approach. "
+        round_hint = "The previous solution is likely flawed or suboptimal. Try a completely different approach."
     else:
-        prefix = "The previous solution is almost certainly incorrect. Find a different solution method and give a different answer. "
+        round_hint = "The previous solution is almost certainly incorrect. Find a different solution method and give a different answer."
 
-    template = prefix + MathPromptTemplates.CRITIC_PROMPT.format(problem=problem, previous_solution=previous_solution)
-    return template
+    return _CRITIC_TEMPLATE.substitute(
+        problem=problem, previous_solution=previous_solution, round_hint=round_hint
+    )
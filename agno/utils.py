@@ -1,5 +1,55 @@
+import io
 import re
-from typing import Optional
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+
+
+try:
+    # RE2 scans in linear time, without backtracking on long model outputs
+    import re2 as _regex_engine
+except ImportError:
+    _regex_engine = re
+
+# Answer phrases combined into one alternation, so a solution is scanned once.
+# Each phrase has its own group, numbered in order of priority. "Final answer:"
+# shares the rank of "Answer:", which always matches inside it.
+# Case-insensitivity is set inline because re2.compile takes no re flags.
+_ANSWER_RE = _regex_engine.compile(
+    r"(?i)Therefore,?\s*(?:the\s+)?answer\s+is\s*([0-9.]+)"
+    r"|The\s+final\s+answer\s+is\s*([0-9.]+)"
+    r"|(?:Final\s+)?Answer:\s*([0-9.]+)"
+    r"|Hence,?\s*(?:the\s+)?answer\s+is\s*([0-9.]+)"
+    r"|Thus,?\s*(?:the\s+)?answer\s+is\s*([0-9.]+)"
+    r"|\\boxed\{([0-9.]+)\}"
+)
+_NUMBER_CHARS = "0123456789."
+_REVISED_MARKER = "REVISED SOLUTION:"
+_INCORRECT_MARKER = "VERIFICATION: INCORRECT"
+# Bodies a verifier writes when it has no revision to offer
+_PLACEHOLDER_REVISIONS = {"none", "(none)", "n/a", "na", "-"}
+
+
+def _last_number(text: str) -> Optional[str]:
+    """
+    Find the last run of digits and dots in a text.
+
+    Scans back from the end instead of collecting every number in the text.
+
+    Args:
+        text: The text to scan
+
+    Returns:
+        Optional[str]: The last number, or None if the text has no digits or dots
+    """
+    end = max(text.rfind(char) for char in _NUMBER_CHARS)
+    if end == -1:
+        return None
+
+    start = end
+    while start > 0 and text[start - 1] in _NUMBER_CHARS:
+        start -= 1
+    return text[start:end + 1]
 
 
 class MathTools:
@@ -16,27 +66,157 @@ class MathTools:
         Returns:
             Optional[str]: The extracted answer, or None if no answer pattern is found
         """
-        answer_patterns = [
-            r"Therefore,?\s*(?:the\s+)?answer\s+is\s*([0-9.]+)",
-            r"The\s+final\s+answer\s+is\s*([0-9.]+)",
-            r"Answer:\s*([0-9.]+)",
-            r"Final\s+answer:\s*([0-9.]+)",
-            r"Hence,?\s*(?:the\s+)?answer\s+is\s*([0-9.]+)",
-            r"Thus,?\s*(?:the\s+)?answer\s+is\s*([0-9.]+)",
-            r"\\boxed{([0-9.]+)}",
-        ]
-
-        for pattern in answer_patterns:
-            match = re.search(pattern, solution, re.IGNORECASE)
-            if match:
-                return match.group(1)
+        # The first occurrence of the highest-priority phrase wins, as when the
+        # phrases were searched for one after another
+        best = None
+        for match in _ANSWER_RE.finditer(solution):
+            rank, answer = next(
+                (rank, group) for rank, group in enumerate(match.groups()) if group is not None
+            )
+            if best is None or rank < best[0]:
+                best = (rank, answer)
+                if rank == 0:
+                    break
+        if best is not None:
+            return best[1]
 
         # If no pattern matched, try to find the last number in the solution
-        numbers = re.findall(r"[0-9.]+", solution)
-        if numbers:
-            return numbers[-1]
+        return _last_number(solution)
 
-        return None
+    @staticmethod
+    def extract_revised_solution(verification_result: str) -> Optional[str]:
+        """
+        Extract the revised solution from a verification response.
+
+        Args:
+            verification_result: The verification response text
+
+        Returns:
+            Optional[str]: The revised solution, or None if the solution was not
+            judged incorrect or the revised section is empty or a placeholder
+        """
+        if _INCORRECT_MARKER not in verification_result:
+            return None
+
+        idx = verification_result.rfind(_REVISED_MARKER)
+        if idx == -1:
+            return None
+
+        revised = verification_result[idx + len(_REVISED_MARKER):]
+        revised = revised.partition("VERIFICATION:")[0].strip()
+        # An echoed prompt hint such as "[If incorrect, ...]" is no solution either
+        if (
+            not revised
+            or revised.lower() in _PLACEHOLDER_REVISIONS
+            or (revised.startswith("[") and revised.endswith("]"))
+        ):
+            return None
+        return revised
+
+    @staticmethod
+    def format_solutions(solutions: List[str]) -> str:
+        """
+        Format candidate solutions as numbered blocks for the selector prompt.
+
+        Args:
+            solutions: The candidate solutions
+
+        Returns:
+            str: The solutions, numbered from 1 and separated by blank lines
+        """
+        buffer = io.StringIO()
+        for i, solution in enumerate(solutions):
+            if i:
+                buffer.write("\n\n")
+            buffer.write(f"Solution {i + 1}:\n{solution}")
+        return buffer.getvalue()
+
+
+class LLMCache:
+    """In-process LRU cache of LLM responses, keyed by a prompt digest."""
+
+    def __init__(self, maxsize: int = 512):
+        """
+        Initialize the cache.
+
+        Args:
+            maxsize: Maximum number of cached responses (default: 512)
+        """
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        # Concurrent rounds look up and store responses from worker threads
+        self._lock = threading.Lock()
+
+    def lookup(self, prompt_key: str) -> Optional[str]:
+        """
+        Look up a cached response.
+
+        Args:
+            prompt_key: The prompt digest
+
+        Returns:
+            Optional[str]: The cached response, or None on a miss
+        """
+        with self._lock:
+            content = self._entries.get(prompt_key)
+            if content is not None:
+                self._entries.move_to_end(prompt_key)
+        return content
+
+    def update(self, prompt_key: str, content: str) -> None:
+        """
+        Store a response, evicting the least recently used one if full.
+
+        Args:
+            prompt_key: The prompt digest
+            content: The response content
+        """
+        with self._lock:
+            self._entries[prompt_key] = content
+            self._entries.move_to_end(prompt_key)
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+class RedisLLMCache(LLMCache):
+    """LLM response cache stored in Redis, shared across processes."""
+
+    def __init__(self, url: str = "redis://localhost:6379/0", ttl: int = 86400):
+        """
+        Initialize the cache.
+
+        Args:
+            url: Redis connection URL (default: "redis://localhost:6379/0")
+            ttl: Expiry of cached responses in seconds (default: 86400)
+        """
+        import redis
+
+        super().__init__()
+        self._client = redis.from_url(url)
+        self.ttl = ttl
+
+    def lookup(self, prompt_key: str) -> Optional[str]:
+        """
+        Look up a cached response in Redis.
+
+        Args:
+            prompt_key: The prompt digest
+
+        Returns:
+            Optional[str]: The cached response, or None on a miss
+        """
+        content = self._client.get(prompt_key)
+        return content.decode() if content is not None else None
+
+    def update(self, prompt_key: str, content: str) -> None:
+        """
+        Store a response in Redis, expiring it after the TTL.
+
+        Args:
+            prompt_key: The prompt digest
+            content: The response content
+        """
+        self._client.setex(prompt_key, self.ttl, content)
 
 
 def get_calculator_tools():
@@ -11,6 +11,9 @@ from autogen_agentchat.ui import Console
 
 from prompts import MathPromptTemplates
 
+# Load environment variables from .env file if exists
+load_dotenv(override=True)
+
 
 class MathReasonerAgent:
     """
@@ -35,9 +38,6 @@ class MathReasonerAgent:
             temperature: Temperature for generation (default: 1.0)
             token_limit: Maximum token limit (default: 8192)
         """
-        # Load environment variables
-        load_dotenv(override=True)
-
         # Initialize API key and base URL variables
         self.api_key = (api_key if api_key else os.environ.get("OPENAI_COMPATIBLE_MODEL_API_KEY"))
         self.api_base_url = (api_base_url if api_base_url else os.environ.get("OPENAI_COMPATIBLE_MODEL_API_BASE_URL"))
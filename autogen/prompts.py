@@ -2,10 +2,12 @@
 Prompt templates.
 """
 
+from textwrap import dedent
+
 
 class MathPromptTemplates:
     # System prompt
-    SYSTEM_PROMPT = """
+    SYSTEM_PROMPT = dedent("""
             You are a mathematical deductive reasoner. You are tasked to solve challenging mathematical problems.
 
             ===== MODELING OF DEDUCTIVE REASONING =====
@@ -33,7 +35,7 @@ class MathPromptTemplates:
             [final answer]
 
             Return final answer within \\boxed{{}}
-            """
+            """).strip()
 
     # Problem format prompt
     PROBLEM_FORMAT = (
@@ -41,7 +43,7 @@ class MathPromptTemplates:
     )
 
     # Critic prompt
-    CRITIC_PROMPT = """
+    CRITIC_PROMPT = dedent("""
             You are a mathematical deductive reasoner with a critical eye. 
             Your task is to analyze a previous solution to a mathematical problem and find alternative approaches.
 
@@ -52,10 +54,10 @@ class MathPromptTemplates:
 
             ===== OUTPUT =====
             Return your final answer within \\boxed{{}}
-            """
+            """).strip()
             
     # Verification prompt
-    VERIFICATION_PROMPT = """
+    VERIFICATION_PROMPT = dedent("""
             You are a rigorous mathematical verification expert. 
             Your task is to verify a proposed solution to a mathematical problem with extreme thoroughness.
                     
@@ -73,4 +75,4 @@ class MathPromptTemplates:
 
             REVISED SOLUTION:
             [If incorrect, provide the corrected solution]
-            """
+            """).strip()
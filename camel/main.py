@@ -1,5 +1,6 @@
-from dotenv import load_dotenv
-
+import queue
+import logging
+from logging.handlers import QueueHandler, QueueListener
 from math_agent import MathReasonerAgent
 from camel.types import ModelPlatformType
 
@@ -15,9 +16,21 @@ Find $m+n$.
 """
 
 
-def main():
-    load_dotenv(override=True)
+def setup_logging(level=logging.INFO):
+    """
+    Route log records through a queue, so emitting them never blocks on stdout.
+
+    Returns:
+        The started listener, which writes the records from its own thread
+    """
+    log_queue = queue.Queue()
+    listener = QueueListener(log_queue, logging.StreamHandler())
+    logging.basicConfig(level=level, handlers=[QueueHandler(log_queue)])
+    listener.start()
+    return listener
 
+
+def main():
     agent = MathReasonerAgent(
         model_platform=ModelPlatformType.DEEPSEEK,
         model_type="deepseek-chat",
@@ -33,4 +46,8 @@ if __name__ == "__main__":
     print("Math Reasoner Agent usage examples")
     print("=" * 70)
 
-    main()
+    listener = setup_logging()
+    try:
+        main()
+    finally:
+        listener.stop()
@@ -1,6 +1,9 @@
 import os
 import re
-from typing import Optional, List
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, List, Union
 from dotenv import load_dotenv
 
 from camel.agents import ChatAgent
@@ -17,6 +20,17 @@ from prompts import (
     get_verification_prompt,
 )
 
+# Load environment variables from .env file if exists
+load_dotenv(override=True)
+
+
+logger = logging.getLogger(__name__)
+
+_BEST_RE = re.compile(r"Solution\s+(\d+)\s+is the best", re.IGNORECASE)
+_VERIFIED_MARKER = "VERIFICATION: CORRECT"
+# Requests in flight at once when a batch is sent to the vLLM server
+_BATCH_CONCURRENCY = 32
+
 
 class MathReasonerAgent:
     """
@@ -33,7 +47,11 @@ class MathReasonerAgent:
         vllm_model_path: Optional[str] = None,
         temperature: float = 1.0,
         token_limit: int = 8192,
+        selection_token_limit: int = 512,
+        verification_token_limit: int = 1024,
         selection_strategy: str = "agent",
+        sampling_strategy: str = "critic",
+        max_verification_attempts: int = 3,
     ):
         """
         Initialize the MathReasonerAgent.
@@ -47,11 +65,12 @@ class MathReasonerAgent:
             vllm_model_path: Path to local vLLM model (default: None)
             temperature: Temperature for generation (default: 1.0)
             token_limit: Maximum token limit (default: 8192)
+            selection_token_limit: Maximum output tokens of the selection call (default: 512)
+            verification_token_limit: Maximum output tokens of a verification call (default: 1024)
             selection_strategy: Strategy for selecting the best solution ("agent", "last", "all")
+            sampling_strategy: Strategy for generating candidate solutions ("critic", "batch")
+            max_verification_attempts: Maximum number of verification attempts (default: 3)
         """
-        # Load environment variables
-        load_dotenv(override=True)
-
         # Initialize API key and base URL variables
         api_key_for_model = None
         api_base_url_for_model = None
@@ -87,10 +106,16 @@ class MathReasonerAgent:
         self.use_vllm_local = use_vllm_local
         self.vllm_model_path = vllm_model_path
         self.token_limit = token_limit
+        self.selection_token_limit = selection_token_limit
+        self.verification_token_limit = verification_token_limit
         self.selection_strategy = selection_strategy
+        self.sampling_strategy = sampling_strategy
+        self.max_verification_attempts = max_verification_attempts
+        self._model_cache = {}
+        self._agent_cache = {}
 
         # Initialize LLM
-        self._initialize_llm()
+        self.model = self._initialize_llm()
 
         # Initialize math tools
         self.math_tools = MathToolkit().get_tools()
@@ -99,24 +124,34 @@ class MathReasonerAgent:
         self.system_message = get_system_prompt()
 
         # Initialize chat agent
-        self.agent = ChatAgent(
-            system_message=self.system_message,
-            model=self.model,
-            tools=self.math_tools,
-            token_limit=token_limit,
-        )
+        self.agent = self._get_agent(self.system_message, tools=self.math_tools)
 
-    def _initialize_llm(self, temperature=None):
+    def _initialize_llm(self, temperature=None, max_tokens=None, **extra_config):
         """
-        Initialize the LLM.
+        Initialize the LLM, reusing the model already built for the same settings.
+
+        Args:
+            temperature: Optional temperature overriding the default one
+            max_tokens: Optional output token limit overriding the default one
+            **extra_config: Further model config entries, such as stream or n
+
+        Returns:
+            The model backend
         """
-        model_config = self.model_config_dict.copy()
+        model_config = {**self.model_config_dict, **extra_config}
         if temperature is not None:
             model_config["temperature"] = temperature
+        if max_tokens is not None:
+            model_config["max_tokens"] = max_tokens
+
+        cache_key = tuple(sorted(model_config.items()))
+        cached_model = self._model_cache.get(cache_key)
+        if cached_model is not None:
+            return cached_model
 
         if self.use_vllm_local and self.vllm_model_path:
             # Local vLLM model
-            self.model = ModelFactory.create(
+            model = ModelFactory.create(
                 model_platform=ModelPlatformType.VLLM,
                 model_type=self.vllm_model_path,
                 model_config_dict=model_config,
@@ -129,7 +164,7 @@ class MathReasonerAgent:
                 elif self.model_platform == ModelPlatformType.OPENAI_COMPATIBLE_MODEL:
                     self.model_type = "gpt-4o-mini"
 
-            self.model = ModelFactory.create(
+            model = ModelFactory.create(
                 model_platform=self.model_platform,
                 model_type=self.model_type,
                 api_key=self.api_key,
@@ -137,28 +172,62 @@ class MathReasonerAgent:
                 model_config_dict=model_config,
             )
 
-    def _create_new_agent(self, system_prompt, temperature=None):
+        self._model_cache[cache_key] = model
+        return model
+
+    def _create_new_agent(self, system_prompt, temperature=None, max_tokens=None, tools=None):
         """
         Create a new agent with a different system prompt.
 
         Args:
             system_prompt: The system prompt for the new agent
             temperature: Optional temperature for the new agent
+            max_tokens: Optional output token limit for the new agent
+            tools: Optional tools available to the new agent
 
         Returns:
             A new ChatAgent
         """
-        # Initialize a new model with different temperature
-        pre_temperature = self.model_config_dict["temperature"]
-        self._initialize_llm(
-            temperature=temperature if temperature is not None else pre_temperature
-        )
+        # Get the model for the requested settings
+        model = self._initialize_llm(temperature=temperature, max_tokens=max_tokens)
 
         # Create a new agent with the new system prompt
         return ChatAgent(
-            system_message=system_prompt, model=self.model, token_limit=self.token_limit
+            system_message=system_prompt,
+            model=model,
+            tools=tools,
+            token_limit=self.token_limit,
         )
 
+    def _get_agent(self, system_prompt, temperature=None, max_tokens=None, slot=0, tools=None):
+        """
+        Get an agent for a system prompt and settings, reusing a cached one if possible.
+
+        A reused agent is reset, so it starts without the dialogue of its previous task.
+        Agents are cached per calling thread, so solve_problem calls running on
+        different threads never share, and reset, the same agent.
+
+        Args:
+            system_prompt: The system prompt for the agent
+            temperature: Optional temperature for the agent
+            max_tokens: Optional output token limit for the agent
+            slot: Index telling apart agents that must run at the same time
+            tools: Optional tools available to the agent
+
+        Returns:
+            A ChatAgent with an empty dialogue memory
+        """
+        cache_key = (
+            threading.get_ident(), system_prompt, temperature, max_tokens, slot, tools is not None
+        )
+        agent = self._agent_cache.get(cache_key)
+        if agent is None:
+            agent = self._create_new_agent(system_prompt, temperature, max_tokens, tools)
+            self._agent_cache[cache_key] = agent
+        else:
+            agent.reset()
+        return agent
+
     def solve_problem(self, problem: str, num_rounds: int = 3) -> str:
         """
         Solve a mathematical problem using multi-round reasoning.
@@ -171,37 +240,43 @@ class MathReasonerAgent:
             The solution to the problem.
         """
         all_solutions = []
-        prev_solution = None
-
-        print(f"Solving problem with {num_rounds} rounds of reasoning...")
-
-        # Multi-round reasoning
-        for round_idx in range(num_rounds):
-            print(f"\nRound {round_idx + 1}/{num_rounds}")
 
-            # Format the problem message using the prompts library
-            if round_idx == 0:
-                # First round: just the problem
-                problem_message = format_problem(problem)
-                agent = self.agent
-            else:
-                # Subsequent rounds: include previous solution with critique
-                critic_prompt = get_critic_prompt(problem, prev_solution, round_idx)
-                agent = self._create_new_agent(critic_prompt, temperature=0.9)
-                problem_message = f"Provide a different solution to this problem."
-
-            # Get response from the agent
-            response = agent.step(problem_message)
-            solution = response.msg.content
+        logger.info("Solving problem with %d rounds of reasoning...", num_rounds)
 
+        if self.sampling_strategy == "batch":
+            # Independent samples of the problem, drawn in a single request
+            solutions = self._sample_solutions(problem, num_rounds)
+        else:
+            # First round: just the problem, without the dialogue of a previous problem
+            agent = self._get_agent(self.system_message, tools=self.math_tools)
+            response = agent.step(format_problem(problem))
+            solutions = [response.msg.content]
+
+            # Subsequent rounds: critique the first-round solution. The rounds do
+            # not depend on each other, so their requests are issued concurrently.
+            if num_rounds > 1:
+                # Only keep memory of the first round's final answer
+                first_answer = MathTools.extract_final_answer(solutions[0])
+                prev_solution = first_answer if first_answer else solutions[0]
+
+                # The critic agents share a static system prompt and receive the
+                # critique as their message, so they are reused across problems
+                critic_agents = [
+                    self._get_agent(self.system_message, temperature=0.9, slot=round_idx)
+                    for round_idx in range(1, num_rounds)
+                ]
+                critic_messages = [
+                    get_critic_prompt(problem, prev_solution, round_idx)
+                    + "\n\nProvide a different solution to this problem."
+                    for round_idx in range(1, num_rounds)
+                ]
+                solutions += self._step_agents(critic_agents, critic_messages)
+
+        for round_idx, solution in enumerate(solutions):
             final_answer = MathTools.extract_final_answer(solution)
-            all_solutions.append(final_answer)
-            prev_solution = final_answer
+            all_solutions.append(final_answer or solution)
 
-            # Only keep memory of the previous round's final answer
-            prev_solution = final_answer if final_answer else solution
-
-            print(f"Extracted answer: {final_answer}")
+            logger.info("Extracted answer of round %d: %s", round_idx + 1, final_answer)
 
         # Choose final solution based on selection strategy
         if self.selection_strategy == "last":
@@ -214,12 +289,244 @@ class MathReasonerAgent:
 
         # Verify the solution
         if self.selection_strategy != "all":
-            verified_solution = self._verify_solution(problem, final_solution)
+            verified_solution = self._verify_solution(
+                problem, final_solution, max_attempts=self.max_verification_attempts
+            )
         else:
             verified_solution = final_solution
 
         return verified_solution
 
+    def solve_problems_batch(
+        self, problems: List[str], num_rounds: int = 3
+    ) -> Union[List[str], List[List[str]]]:
+        """
+        Solve several problems on the configured vLLM server in batched passes.
+
+        Every phase (reasoning, selection and verification) sends the requests
+        of all problems to the server concurrently, so vLLM can batch them. The
+        requests go through the same model backend and settings as
+        solve_problem, so no second engine is loaded. The rounds are
+        independent samples, and the chat agent and its math tools are bypassed.
+
+        Args:
+            problems: The mathematical problems to solve
+            num_rounds: Number of solutions sampled per problem (default: 3)
+
+        Returns:
+            The solution to each problem, in order, or with selection strategy
+            "all" the extracted answers of every round of each problem
+        """
+        if not (self.use_vllm_local and self.vllm_model_path):
+            raise ValueError("Batch solving requires use_vllm_local and vllm_model_path")
+
+        logger.info("Solving %d problems with %d rounds of reasoning...", len(problems), num_rounds)
+
+        # Reasoning: all rounds of all problems in one pass
+        outputs = self._generate_batch(
+            self.system_message,
+            [format_problem(problem) for problem in problems],
+            temperature=self.model_config_dict["temperature"],
+            max_tokens=self.token_limit,
+            n=num_rounds,
+        )
+        all_solutions = [
+            [MathTools.extract_final_answer(sample) or sample for sample in samples]
+            for samples in outputs
+        ]
+
+        # Choose final solutions based on selection strategy
+        if self.selection_strategy == "last":
+            final_solutions = [solutions[-1] for solutions in all_solutions]
+        elif self.selection_strategy == "all":
+            return all_solutions
+        else:  # Use selection strategy "agent" (default)
+            final_solutions = [solutions[-1] for solutions in all_solutions]
+            pending = [idx for idx, solutions in enumerate(all_solutions) if len(set(solutions)) > 1]
+            if pending:
+                messages = [
+                    f"Problem: {problems[idx]}\n\n{MathTools.format_solutions(all_solutions[idx])}"
+                    "\n\nPlease select the best solution and explain why."
+                    for idx in pending
+                ]
+                results = self._generate_batch(
+                    get_selector_prompt(),
+                    messages,
+                    temperature=0.3,
+                    max_tokens=self.selection_token_limit,
+                )
+                for idx, (selection_result,) in zip(pending, results):
+                    match = _BEST_RE.search(selection_result)
+                    if match and 0 < int(match.group(1)) <= len(all_solutions[idx]):
+                        final_solutions[idx] = all_solutions[idx][int(match.group(1)) - 1]
+
+        # Verification: one pass per attempt over the problems not yet verified
+        pending = list(range(len(problems)))
+        for _ in range(self.max_verification_attempts):
+            if not pending:
+                break
+            messages = [
+                f"Problem: {problems[idx]}\n\nSolution to verify:\n{final_solutions[idx]}"
+                for idx in pending
+            ]
+            results = self._generate_batch(
+                get_verification_prompt(),
+                messages,
+                temperature=0.3,
+                max_tokens=self.verification_token_limit,
+            )
+            still_pending = []
+            for idx, (verification_result,) in zip(pending, results):
+                if _VERIFIED_MARKER in verification_result:
+                    continue
+                revised_solution = MathTools.extract_revised_solution(verification_result)
+                if revised_solution:
+                    final_solutions[idx] = revised_solution
+                    still_pending.append(idx)
+                else:
+                    final_solutions[idx] = (
+                        f"{final_solutions[idx]}\n\n===== VERIFICATION NOTES =====\n{verification_result}"
+                    )
+            pending = still_pending
+
+        return final_solutions
+
+    def _generate_batch(
+        self,
+        system_prompt: str,
+        messages: List[str],
+        temperature: float,
+        max_tokens: int,
+        n: int = 1,
+    ) -> List[List[str]]:
+        """
+        Generate completions for several user messages on the vLLM server.
+
+        The requests are sent concurrently, and the server's continuous
+        batching runs them together.
+
+        Args:
+            system_prompt: The system prompt shared by every conversation
+            messages: The user message of each conversation
+            temperature: Sampling temperature of the completions
+            max_tokens: Maximum output tokens of each completion
+            n: Number of completions per conversation (default: 1)
+
+        Returns:
+            The completions of each conversation, in order
+        """
+        if not messages:
+            return []
+
+        extra_config = {"n": n} if n > 1 else {}
+        model = self._initialize_llm(temperature=temperature, max_tokens=max_tokens, **extra_config)
+
+        def generate(message: str) -> List[str]:
+            response = model.run(
+                [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": message},
+                ]
+            )
+            return [choice.message.content for choice in response.choices]
+
+        with ThreadPoolExecutor(max_workers=min(len(messages), _BATCH_CONCURRENCY)) as executor:
+            return list(executor.map(generate, messages))
+
+    def _sample_solutions(self, problem: str, num_samples: int) -> List[str]:
+        """
+        Draw several independent solutions from a single request.
+
+        A model configured with `n` returns that many samples for one prompt, so
+        the prompt is only sent and prefilled once. This bypasses the chat agent
+        and its math tools, except for samples an endpoint ignoring `n` left out.
+
+        Args:
+            problem: The mathematical problem to solve
+            num_samples: Number of solutions to sample
+
+        Returns:
+            The sampled solutions
+        """
+        try:
+            model = self._initialize_llm(n=num_samples)
+        except ValueError:
+            # Backends whose config has no n cannot batch samples
+            solutions = []
+        else:
+            response = model.run(
+                [
+                    {"role": "system", "content": self.system_message},
+                    {"role": "user", "content": format_problem(problem)},
+                ]
+            )
+            solutions = [choice.message.content for choice in response.choices]
+
+        # Endpoints that ignore n, such as DeepSeek, return a single sample, so
+        # the missing ones are drawn by agents stepped concurrently
+        missing = num_samples - len(solutions)
+        if missing > 0:
+            agents = [
+                self._get_agent(self.system_message, slot=slot)
+                for slot in range(1, missing + 1)
+            ]
+            solutions += self._step_agents(agents, [format_problem(problem)] * missing)
+        return solutions
+
+    def _stream_until(
+        self, model, system_prompt: str, message: str, stop_marker: str
+    ) -> str:
+        """
+        Stream a completion and stop once the marker has been generated.
+
+        The request goes to the model backend directly, since a ChatAgent only
+        returns after the full response has been decoded.
+
+        Args:
+            model: The model backend to query, configured to stream
+            system_prompt: The system prompt
+            message: The user message
+            stop_marker: Text that ends generation as soon as it is streamed
+
+        Returns:
+            The (possibly truncated) response content
+        """
+        content = ""
+        stream = model.run(
+            [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": message},
+            ]
+        )
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                delta = chunk.choices[0].delta.content
+                content += delta
+                # The marker can only have been completed by the latest chunk
+                if stop_marker in content[-(len(delta) + len(stop_marker)):]:
+                    # Closing the stream aborts the remaining generation
+                    stream.close()
+                    break
+        return content
+
+    def _step_agents(self, agents: List[ChatAgent], messages: List[str]) -> List[str]:
+        """
+        Step several agents concurrently.
+
+        Each agent takes its blocking step on a worker thread, so no event loop
+        is created per problem and the call also works from a running loop.
+
+        Args:
+            agents: The agents to step
+            messages: The user message sent to each agent, in order
+
+        Returns:
+            The response content of each agent, in order
+        """
+        with ThreadPoolExecutor(max_workers=len(agents)) as executor:
+            responses = list(executor.map(ChatAgent.step, agents, messages))
+        return [response.msg.content for response in responses]
+
     def _select_solution(self, problem: str, solutions: List[str]) -> str:
         """
         Select the best solution from multiple candidates.
@@ -232,12 +539,12 @@ class MathReasonerAgent:
             The best solution
         """
         selector_prompt = get_selector_prompt()
-        selector_agent = self._create_new_agent(selector_prompt, temperature=0.3)
+        selector_agent = self._get_agent(
+            selector_prompt, temperature=0.3, max_tokens=self.selection_token_limit
+        )
 
         # Format the solutions into a single message
-        solutions_text = "\n\n".join(
-            [f"Solution {i + 1}:\n{solution}" for i, solution in enumerate(solutions)]
-        )
+        solutions_text = MathTools.format_solutions(solutions)
         selection_message = f"Problem: {problem}\n\n{solutions_text}\n\nPlease select the best solution and explain why."
 
         # Get response from the selector agent
@@ -245,9 +552,11 @@ class MathReasonerAgent:
         selection_result = response.msg.content
 
         # Extract the selected solution
-        for i, solution in enumerate(solutions):
-            if f"Solution {i + 1}" in selection_result and "best" in selection_result:
-                return solution
+        match = _BEST_RE.search(selection_result)
+        if match:
+            solution_idx = int(match.group(1)) - 1
+            if 0 <= solution_idx < len(solutions):
+                return solutions[solution_idx]
 
         # Default to the last solution if no clear selection
         return solutions[-1]
@@ -266,9 +575,11 @@ class MathReasonerAgent:
         Returns:
             The verified solution
         """
-        print("=====Verifying the solution...=====")
+        logger.info("=====Verifying the solution...=====")
         verification_prompt = get_verification_prompt()
-        verification_agent = self._create_new_agent(verification_prompt, temperature=0.3)
+        verification_model = self._initialize_llm(
+            temperature=0.3, max_tokens=self.verification_token_limit, stream=True
+        )
 
         current_solution = solution
 
@@ -277,23 +588,25 @@ class MathReasonerAgent:
                 f"Problem: {problem}\n\nSolution to verify:\n{current_solution}"
             )
 
-            # Get response from the verification agent
-            response = verification_agent.step(verification_message)
-            verification_result = response.msg.content
+            # Stream the verification, stopping as soon as the solution is verified
+            verification_result = self._stream_until(
+                verification_model,
+                verification_prompt,
+                verification_message,
+                stop_marker=_VERIFIED_MARKER,
+            )
 
             # Check if the solution is verified
-            if "VERIFICATION: CORRECT" in verification_result:
-                print(f"Solution verified as correct after {attempt + 1} attempts.")
+            if _VERIFIED_MARKER in verification_result:
+                logger.info("Solution verified as correct after %d attempts.", attempt + 1)
                 return current_solution
 
             # If not verified, extract the revised solution
-            revised_match = re.search(
-                r"REVISED SOLUTION:(.*?)(?=$|VERIFICATION:)", verification_result, re.DOTALL
-            )
+            revised_solution = MathTools.extract_revised_solution(verification_result)
 
-            if revised_match:
-                current_solution = revised_match.group(1).strip()
-                print(f"Solution revised in attempt {attempt + 1}.")
+            if revised_solution:
+                current_solution = revised_solution
+                logger.info("Solution revised in attempt %d.", attempt + 1)
             else:
                 return f"{current_solution}\n\n===== VERIFICATION NOTES =====\n{verification_result}"
 
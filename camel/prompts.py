@@ -1,5 +1,9 @@
+from functools import lru_cache
+from textwrap import dedent
+
+
 class MathPrompts:
-    SYSTEM_PROMPT = """
+    SYSTEM_PROMPT = dedent("""
         You are a mathematical deductive reasoner. You are tasked to solve challenging mathematical problems.
 
         ===== MODELING OF DEDUCTIVE REASONING =====
@@ -27,13 +31,13 @@ class MathPrompts:
         [final answer]
         
         Return final answer within \\boxed{}.
-                    """
+    """).strip()
 
     PROBLEM_FORMAT = (
         "Please solve this mathematical problem using deductive reasoning: {problem}"
     )
 
-    CRITIC_PROMPT = """
+    CRITIC_PROMPT = dedent("""
         You are a mathematical deductive reasoner with a critical eye. 
         Your task is to analyze a previous solution to a mathematical problem and find alternative approaches.
         
@@ -42,17 +46,19 @@ class MathPrompts:
         
         Be creative, rigorous, and thorough in your reasoning. Show each step clearly.
         
-        ===== PREVIOUS SOLUTION =====
-        {0}
+        ===== OUTPUT =====
+        Return your final answer within \\boxed{{}}
         
         ===== ORIGINAL PROBLEM =====
-        {1}
+        {problem}
         
-        ===== OUTPUT =====
-        Return your final answer within \\boxed{{}}
-    """
+        ===== PREVIOUS SOLUTION =====
+        {previous_solution}
+        
+        {round_hint}
+    """).strip()
 
-    SELECTOR_PROMPT = """
+    SELECTOR_PROMPT = dedent("""
         You are a mathematical solution evaluator. 
         Your task is to analyze multiple proposed solutions to a mathematical problem and select the most reliable one.
                 
@@ -66,9 +72,9 @@ class MathPrompts:
         
         SELECTION:
         Solution [X] is the best.
-    """
+    """).strip()
 
-    VERIFICATION_PROMPT = """
+    VERIFICATION_PROMPT = dedent("""
         You are a rigorous mathematical verification expert. 
         Your task is to verify a proposed solution to a mathematical problem with extreme thoroughness.
                 
@@ -78,15 +84,15 @@ class MathPrompts:
         VERIFICATION PROCESS:
         [Detail your verification steps]
         
-        ISSUES FOUND:
-        [List any issues or errors]
-        
         VERIFICATION RESULT:
         [Either "VERIFICATION: CORRECT" or "VERIFICATION: INCORRECT"]
         
+        ISSUES FOUND:
+        [List any issues or errors]
+        
         REVISED SOLUTION:
         [If incorrect, provide the corrected solution]
-    """
+    """).strip()
 
     @staticmethod
     def get_prompt(prompt_type, **kwargs):
@@ -100,33 +106,51 @@ class MathPrompts:
         Returns:
             str: The formatted prompt
         """
-        if prompt_type == "system":
-            return MathPrompts.SYSTEM_PROMPT
+        if prompt_type in _STATIC_PROMPTS:
+            return _STATIC_PROMPTS[prompt_type]
         elif prompt_type == "problem":
-            return MathPrompts.PROBLEM_FORMAT.format(problem=kwargs.get("problem", ""))
+            return _format_problem(kwargs.get("problem", ""))
         elif prompt_type == "critic":
-            problem = kwargs.get("problem", "")
-            previous_solution = kwargs.get("previous_solution", "")
-            round_idx = kwargs.get("round_idx", 1)
-            prefix = ""
-            if round_idx == 1:
-                prefix = (
-                    "The previous solution might contain errors or inefficiencies. "
-                )
-            elif round_idx == 2:
-                prefix = "The previous solution is likely flawed or suboptimal. Try a completely different approach. "
-            else:
-                prefix = "The previous solution is almost certainly incorrect. Find a different solution method and give a different answer. "
-
-            critic_prompt = MathPrompts.CRITIC_PROMPT.format(previous_solution, problem)
-            return prefix + critic_prompt
-        elif prompt_type == "selector":
-            return MathPrompts.SELECTOR_PROMPT
-        elif prompt_type == "verification":
-            return MathPrompts.VERIFICATION_PROMPT
+            return _format_critic(
+                kwargs.get("problem", ""),
+                kwargs.get("previous_solution", ""),
+                kwargs.get("round_idx", 1),
+            )
         else:
             raise ValueError(f"Unknown prompt type: {prompt_type}")
 
+
+_STATIC_PROMPTS = {
+    "system": MathPrompts.SYSTEM_PROMPT,
+    "selector": MathPrompts.SELECTOR_PROMPT,
+    "verification": MathPrompts.VERIFICATION_PROMPT,
+}
+
+
+_ROUND_HINTS = {
+    1: "The previous solution might contain errors or inefficiencies.",
+    2: "The previous solution is likely flawed or suboptimal. Try a completely different approach.",
+    3: "The previous solution is almost certainly incorrect. Find a different solution method and give a different answer.",
+}
+
+# Critic template of each round, with its hint already in the trailing slot
+_CRITIC_TEMPLATES = {
+    round_idx: MathPrompts.CRITIC_PROMPT.replace("{round_hint}", round_hint)
+    for round_idx, round_hint in _ROUND_HINTS.items()
+}
+
+
+@lru_cache(maxsize=256)
+def _format_problem(problem):
+    return MathPrompts.PROBLEM_FORMAT.format(problem=problem)
+
+
+@lru_cache(maxsize=256)
+def _format_critic(problem, previous_solution, round_idx):
+    # Every round other than the first two gets the strongest hint
+    template = _CRITIC_TEMPLATES.get(round_idx, _CRITIC_TEMPLATES[3])
+    return template.format(problem=problem, previous_solution=previous_solution)
+
 def get_system_prompt():
     return MathPrompts.get_prompt("system")
 
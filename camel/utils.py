@@ -1,5 +1,24 @@
+import io
 import re
-from typing import Optional
+from typing import List, Optional
+
+
+# The answer phrases as one pattern with a capture group per phrase, ranked in
+# the order they used to be tried
+_ANSWER_RE = re.compile(
+    r"Therefore,?\s*(?:the\s+)?answer\s+is\s*([0-9.]+)"
+    r"|The\s+final\s+answer\s+is\s*([0-9.]+)"
+    r"|(?:Final\s+)?Answer:\s*([0-9.]+)"
+    r"|Hence,?\s*(?:the\s+)?answer\s+is\s*([0-9.]+)"
+    r"|Thus,?\s*(?:the\s+)?answer\s+is\s*([0-9.]+)"
+    r"|\\boxed\{([0-9.]+)\}",
+    re.IGNORECASE,
+)
+_NUMBER_CHARS = "0123456789."
+_REVISED_MARKER = "REVISED SOLUTION:"
+_INCORRECT_MARKER = "VERIFICATION: INCORRECT"
+# Bodies a verifier writes when it has no revision to offer
+_PLACEHOLDER_REVISIONS = {"none", "(none)", "n/a", "na", "-"}
 
 
 class MathTools:
@@ -16,24 +35,72 @@ class MathTools:
         Returns:
             Optional[str]: The extracted answer, or None if no answer pattern is found
         """
-        answer_patterns = [
-            r"Therefore,?\s*(?:the\s+)?answer\s+is\s*([0-9.]+)",
-            r"The\s+final\s+answer\s+is\s*([0-9.]+)",
-            r"Answer:\s*([0-9.]+)",
-            r"Final\s+answer:\s*([0-9.]+)",
-            r"Hence,?\s*(?:the\s+)?answer\s+is\s*([0-9.]+)",
-            r"Thus,?\s*(?:the\s+)?answer\s+is\s*([0-9.]+)",
-            r"\\boxed{([0-9.]+)}",
-        ]
-
-        for pattern in answer_patterns:
-            match = re.search(pattern, solution, re.IGNORECASE)
-            if match:
-                return match.group(1)
-
-        # If no pattern matched, try to find the last number in the solution
-        numbers = re.findall(r"[0-9.]+", solution)
-        if numbers:
-            return numbers[-1]
-
-        return None
+        # Keep the best-ranked phrase, and of that phrase its first occurrence
+        best = None
+        for match in _ANSWER_RE.finditer(solution):
+            rank, answer = next(
+                (rank, group) for rank, group in enumerate(match.groups()) if group is not None
+            )
+            if best is None or rank < best[0]:
+                best = (rank, answer)
+                if rank == 0:
+                    break
+        if best is not None:
+            return best[1]
+
+        # If no pattern matched, take the last number, scanning back from the end
+        end = len(solution)
+        while end and solution[end - 1] not in _NUMBER_CHARS:
+            end -= 1
+        start = end
+        while start and solution[start - 1] in _NUMBER_CHARS:
+            start -= 1
+        return solution[start:end] or None
+
+    @staticmethod
+    def extract_revised_solution(verification_result: str) -> Optional[str]:
+        """
+        Extract the revised solution from a verification response.
+
+        Args:
+            verification_result: The verification response text
+
+        Returns:
+            Optional[str]: The revised solution, or None if the solution was not
+            judged incorrect or the revised section is empty or a placeholder
+        """
+        if _INCORRECT_MARKER not in verification_result:
+            return None
+
+        idx = verification_result.rfind(_REVISED_MARKER)
+        if idx == -1:
+            return None
+
+        revised = verification_result[idx + len(_REVISED_MARKER):]
+        revised = revised.partition("VERIFICATION:")[0].strip()
+        # An echoed prompt hint such as "[If incorrect, ...]" is no solution either
+        if (
+            not revised
+            or revised.lower() in _PLACEHOLDER_REVISIONS
+            or (revised.startswith("[") and revised.endswith("]"))
+        ):
+            return None
+        return revised
+
+    @staticmethod
+    def format_solutions(solutions: List[str]) -> str:
+        """
+        Format candidate solutions as numbered blocks for the selector prompt.
+
+        Args:
+            solutions: The candidate solutions
+
+        Returns:
+            str: The solutions, numbered from 1 and separated by blank lines
+        """
+        buffer = io.StringIO()
+        for i, solution in enumerate(solutions):
+            if i:
+                buffer.write("\n\n")
+            buffer.write(f"Solution {i + 1}:\n{solution}")
+        return buffer.getvalue()
@@ -23,11 +23,14 @@ class MathSolverState(BaseModel):
 class MathSovlerFlow(Flow[MathSolverState]):
 
     @start()
-    def multi_round_reasoning(self):
-        for _ in range(self.state.rounds):
-            result = MathCrew().base_reasoner_crew().kickoff(inputs={
-                "problem": self.state.problem,
-            })
+    async def multi_round_reasoning(self):
+        # The rounds are independent, so one crew is built and kicked off
+        # concurrently for every round
+        results = await MathCrew().base_reasoner_crew().kickoff_for_each_async(inputs=[
+            {"problem": self.state.problem}
+            for _ in range(self.state.rounds)
+        ])
+        for result in results:
             self.state.answer = extract_answer(result.raw)
             self.state.answer_list.append(self.state.answer)
             
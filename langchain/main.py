@@ -1,5 +1,4 @@
-from dotenv import load_dotenv
-
+import asyncio
 from math_agent import MathReasonerAgent
 
 
@@ -15,15 +14,13 @@ Find $m+n$.
 
 
 def main():
-    load_dotenv(override=True)
-
     agent = MathReasonerAgent(
         model_name="deepseek-chat",
         temperature=1.0,
         token_limit=8192,
     )
 
-    solution = agent.solve_problem(PROBLEM_EXAMPLE, num_rounds=3)
+    solution = asyncio.run(agent.solve_problem(PROBLEM_EXAMPLE, num_rounds=3))
     print(f"\nFinal Solution:\n{solution}")
 
 if __name__ == "__main__":
@@ -1,9 +1,14 @@
 import os
 import re
+import asyncio
 import argparse
+from collections import Counter
+from contextlib import aclosing
+from dataclasses import dataclass
 from typing import Optional, List
 from dotenv import load_dotenv
 
+from langchain_core.caches import BaseCache, InMemoryCache
 from langchain_core.messages import SystemMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 from langchain_core.output_parsers import StrOutputParser
@@ -13,7 +18,27 @@ from langchain_community.llms import VLLM
 from langchain.agents import AgentExecutor, create_openai_functions_agent
 
 from utils import MathTools, get_math_tools
-from prompts import MathPromptTemplates, get_critic_prompt
+from prompts import MathPromptTemplates, get_round_hint
+
+# Load environment variables from .env file if exists
+load_dotenv(override=True)
+
+
+_BEST_RE = re.compile(r"Solution\s+(\d+)\s+is the best", re.IGNORECASE)
+_VERIFIED_MARKER = "VERIFICATION: CORRECT"
+
+
+@dataclass
+class Round:
+    """A reasoning round: its full solution text and the answer extracted from it."""
+
+    solution: str
+    answer: Optional[str] = None
+
+    @property
+    def vote(self) -> str:
+        """The answer the round stands for, or its full text if none was extracted."""
+        return self.answer or self.solution
 
 
 class MathReasonerAgent:
@@ -31,6 +56,8 @@ class MathReasonerAgent:
         temperature: float = 1.0,
         token_limit: int = 8192,
         selection_strategy: str = "agent",
+        sampling_strategy: str = "critic",
+        cache: Optional[BaseCache] = None,
     ):
         """
         Initialize the MathReasonerAgent.
@@ -44,10 +71,9 @@ class MathReasonerAgent:
             temperature: Temperature for generation (default: 1.0)
             token_limit: Maximum token limit (default: 8192)
             selection_strategy: Strategy for selecting the best solution ("agent", "last", "all")
+            sampling_strategy: Strategy for generating candidate solutions ("critic", "batch")
+            cache: Exact-match cache for LLM responses (default: an in-process InMemoryCache)
         """
-        # Load environment variables
-        load_dotenv(override=True)
-
         # Initialize API key and base URL
         self.api_key = (api_key if api_key else os.environ.get("DEEPSEEK_API_KEY"))
         self.api_base_url = (api_base_url if api_base_url else os.environ.get("DEEPSEEK_API_BASE_URL"))
@@ -58,6 +84,8 @@ class MathReasonerAgent:
         self.temperature = temperature
         self.token_limit = token_limit
         self.selection_strategy = selection_strategy
+        self.sampling_strategy = sampling_strategy
+        self.cache = cache if cache is not None else InMemoryCache()
 
         # Get math tools
         self.math_tools = get_math_tools()
@@ -78,6 +106,7 @@ class MathReasonerAgent:
                 model=self.local_model_path,
                 temperature=self.temperature,
                 max_tokens=self.token_limit,
+                cache=self.cache,
             )
         else:
             # Initialize ChatOpenAI model
@@ -87,8 +116,14 @@ class MathReasonerAgent:
                 base_url=self.api_base_url,
                 temperature=self.temperature,
                 max_tokens=self.token_limit,
+                cache=self.cache,
             )
 
+        # Samples repeat one prompt on purpose, so a cache would replay a single
+        # solution for every one of them and fake a unanimous vote. The copy
+        # shares the client, so a local model is not loaded twice.
+        self.sampling_llm = self.llm.model_copy(update={"cache": False})
+
     def _initialize_agent(self) -> None:
         """Initialize the agent."""
         prompt = ChatPromptTemplate.from_messages(
@@ -112,15 +147,34 @@ class MathReasonerAgent:
             handle_parsing_errors=True,
         )
 
-        init_prompt = ChatPromptTemplate.from_messages(
+        self.init_prompt = ChatPromptTemplate.from_messages(
             [
                 ("system", self.system_message.content),
                 ("human", "{input}"),
             ]
         )
-        self.base_chain = init_prompt | self.llm | StrOutputParser()
+        self.base_chain = self.init_prompt | self.llm | StrOutputParser()
+
+        # The critique is the human message; its round hint comes last
+        critic_prompt = ChatPromptTemplate.from_messages(
+            [
+                ("system", self.system_message.content),
+                ("human", MathPromptTemplates.CRITIC_PROMPT),
+            ]
+        )
+        self.critic_chain = critic_prompt | self.llm | StrOutputParser()
+
+        selection_prompt = ChatPromptTemplate.from_template(
+            MathPromptTemplates.SELECTION_PROMPT
+        )
+        self.selection_chain = selection_prompt | self.llm | StrOutputParser()
 
-    def solve_problem(self, problem: str, num_rounds: int = 3) -> str:
+        verification_prompt = ChatPromptTemplate.from_template(
+            MathPromptTemplates.VERIFICATION_PROMPT
+        )
+        self.verification_chain = verification_prompt | self.llm | StrOutputParser()
+
+    async def solve_problem(self, problem: str, num_rounds: int = 3) -> str:
         """
         Solve a mathematical problem using multi-round reasoning.
 
@@ -131,98 +185,185 @@ class MathReasonerAgent:
         Returns:
             The solution to the problem.
         """
-        all_solutions = []
-        prev_solution = None
+        rounds = []
 
         print(f"Solving problem with {num_rounds} rounds of reasoning...")
 
-        # Multi-round reasoning
-        for round_idx in range(num_rounds):
-            print(f"\nRound {round_idx + 1}/{num_rounds}")
-
-            if round_idx == 0:
-                # First round: just the problem
-                problem_message = MathPromptTemplates.PROBLEM_FORMAT.format(
-                    problem=problem
-                )
-                response = self.agent_executor.invoke({"input": problem_message})
-                solution = response["output"]
-            else:
-                # Subsequent rounds: include previous solution with critique
-                critic_prompt = get_critic_prompt(
-                    problem=problem,
-                    previous_solution=prev_solution,
-                    round_idx=round_idx,
-                )
+        problem_message = MathPromptTemplates.PROBLEM_FORMAT.format(
+            problem=problem
+        )
 
-                formatted_input = critic_prompt.format(
-                    problem=problem, 
-                    previous_solution=prev_solution
+        if self.sampling_strategy == "batch":
+            # Independent samples of the problem, drawn in a single request
+            solutions = await self._sample_solutions(problem_message, num_rounds)
+        else:
+            # First round: just the problem
+            response = await self.agent_executor.ainvoke({"input": problem_message})
+            solutions = [response["output"]]
+
+            # Subsequent rounds: critique the full first-round solution. The rounds
+            # do not depend on each other, so their requests are issued concurrently.
+            if num_rounds > 1:
+                print(f"Running {num_rounds - 1} critic rounds concurrently...")
+                solutions += await asyncio.gather(
+                    *(
+                        self.critic_chain.ainvoke(
+                            {
+                                "problem": problem,
+                                "previous_solution": solutions[0],
+                                "round_hint": get_round_hint(round_idx),
+                            }
+                        )
+                        for round_idx in range(1, num_rounds)
+                    )
                 )
-                solution = self.base_chain.invoke({"input": formatted_input})
 
+        for round_idx, solution in enumerate(solutions):
             # Extract final answer
             final_answer = MathTools.extract_final_answer(solution)
-            all_solutions.append(final_answer)
-            prev_solution = final_answer
+            rounds.append(Round(solution=solution, answer=final_answer))
+
+            print(f"Extracted answer of round {round_idx + 1}/{num_rounds}: {final_answer}")
 
-            print(f"Extracted answer: {final_answer}")
+        # Agreement between the rounds tells how much selection and
+        # verification the answer still needs; no rounds means no agreement
+        top_votes = Counter(r.vote for r in rounds).most_common(1)
+        top_count = top_votes[0][1] if top_votes else 0
+        unanimous = len(rounds) > 1 and top_count == len(rounds)
 
         # Select the best solution
         if self.selection_strategy == "last":
-            selected_solution = all_solutions[-1]
-        elif self.selection_strategy == "agent" and len(all_solutions) > 1:
-            selected_solution = self._select_solution(problem, all_solutions)
+            selected_solution = rounds[-1].solution
+        elif self.selection_strategy == "agent" and unanimous:
+            selected_solution = rounds[0].solution
+        elif self.selection_strategy == "agent" and len(rounds) > 1:
+            selected_solution = (await self._select_solution(problem, rounds)).solution
         else:
             selected_solution = (
                 "\n\n===== ALL SOLUTIONS =====\n\n"
-                + "\n\n-----\n\n".join(all_solutions)
+                + "\n\n-----\n\n".join(r.solution for r in rounds)
             )
 
-        # Verify the solution
-        final_solution = self._verify_solution(problem, selected_solution)
+        # Verify the solution, unless every round already reached the same answer
+        if unanimous:
+            return selected_solution
+
+        if len(rounds) > 1 and top_count / len(rounds) >= 2 / 3:
+            max_attempts = 1
+        else:
+            max_attempts = 3
+        final_solution = await self._verify_solution(
+            problem, selected_solution, max_attempts=max_attempts
+        )
         return final_solution
 
-    def _select_solution(self, problem: str, solutions: List[str]) -> str:
+    async def solve_problems(
+        self, problems: List[str], num_rounds: int = 3, max_concurrency: int = 8
+    ) -> List[str]:
+        """
+        Solve several mathematical problems concurrently.
+
+        Each problem goes through the full multi-round pipeline, and the
+        requests of different problems overlap so the provider can batch them.
+
+        Args:
+            problems: The mathematical problems to solve.
+            num_rounds: Number of reasoning rounds per problem (default: 3)
+            max_concurrency: Maximum number of problems solved at once (default: 8)
+
+        Returns:
+            The solution to each problem, in order.
+        """
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def solve(problem: str) -> str:
+            async with semaphore:
+                return await self.solve_problem(problem, num_rounds=num_rounds)
+
+        return await asyncio.gather(*(solve(problem) for problem in problems))
+
+    async def _sample_solutions(self, problem_message: str, num_samples: int) -> List[str]:
+        """
+        Draw several independent solutions of the problem in one batched call.
+
+        The chat model returns `n` samples for a single request, so the prompt
+        is only sent and prefilled once. Endpoints that ignore `n`, such as
+        DeepSeek, return a single sample; the missing ones are then drawn with
+        concurrent single requests. A local vLLM model receives the prompt once
+        per sample in a single batch and shares its prefix in the KV cache.
+        This bypasses the agent executor and its math tools.
+
+        Args:
+            problem_message: The formatted problem message
+            num_samples: Number of solutions to sample
+
+        Returns:
+            The sampled solutions
+        """
+        prompt_value = self.init_prompt.format_prompt(input=problem_message)
+        if isinstance(self.llm, VLLM):
+            result = await self.sampling_llm.agenerate_prompt([prompt_value] * num_samples)
+        else:
+            result = await self.sampling_llm.agenerate_prompt([prompt_value], n=num_samples)
+
+        solutions = [
+            generation.text
+            for generations in result.generations
+            for generation in generations
+        ]
+
+        missing = num_samples - len(solutions)
+        if missing > 0:
+            results = await asyncio.gather(
+                *(self.sampling_llm.agenerate_prompt([prompt_value]) for _ in range(missing))
+            )
+            solutions += [
+                generation.text
+                for result in results
+                for generations in result.generations
+                for generation in generations
+            ]
+        return solutions
+
+    async def _select_solution(self, problem: str, rounds: List[Round]) -> Round:
         """
         Select the best solution from multiple candidates.
 
         Args:
             problem: The original problem
-            solutions: List of solution candidates
+            rounds: The reasoning rounds whose solutions are the candidates
 
         Returns:
-            The selected solution
+            The round with the selected solution
         """
         print("=====Selecting the best solution...=====")
 
-        # Format solutions for the selector prompt
-        formatted_solutions = "\n\n".join(
-            [f"Solution {i + 1}:\n{solution}" for i, solution in enumerate(solutions)]
-        )
+        # A strict majority answer is selected without asking the LLM
+        top_vote, top_count = Counter(r.vote for r in rounds).most_common(1)[0]
+        if top_count > len(rounds) / 2:
+            return next(r for r in rounds if r.vote == top_vote)
 
-        selection_prompt = ChatPromptTemplate.from_template(
-            MathPromptTemplates.SELECTION_PROMPT
+        # Format the full solutions for the selector prompt
+        formatted_solutions = "\n\n".join(
+            [f"Solution {i + 1}:\n{r.solution}" for i, r in enumerate(rounds)]
         )
 
-        selection_chain = selection_prompt | self.llm | StrOutputParser()
-
-        evaluation = selection_chain.invoke(
+        evaluation = await self.selection_chain.ainvoke(
             {"problem": problem, "solutions": formatted_solutions}
         )
 
         # Parse the evaluation to find the selected solution
-        match = re.search(r"Solution\s+(\d+)\s+is the best", evaluation, re.IGNORECASE)
+        match = _BEST_RE.search(evaluation)
 
         if match:
             solution_idx = int(match.group(1)) - 1
-            if 0 <= solution_idx < len(solutions):
-                return solutions[solution_idx]
+            if 0 <= solution_idx < len(rounds):
+                return rounds[solution_idx]
 
         # Default to the last solution if parsing fails
-        return solutions[-1]
+        return rounds[-1]
 
-    def _verify_solution(
+    async def _verify_solution(
         self, problem: str, solution: str, max_attempts: int = 3
     ) -> str:
         """
@@ -239,31 +380,51 @@ class MathReasonerAgent:
         print("=====Verifying the solution...=====")
         current_solution = solution
 
-        verification_prompt = ChatPromptTemplate.from_template(
-            MathPromptTemplates.VERIFICATION_PROMPT
-        )
-        verification_chain = verification_prompt | self.llm | StrOutputParser()
-
         for attempt in range(max_attempts):
-            verification = verification_chain.invoke(
-                {"problem": problem, "solution": current_solution}
+            # Stream the verification, stopping as soon as the solution is verified
+            verification = await self._astream_until(
+                self.verification_chain,
+                {"problem": problem, "solution": current_solution},
+                stop_marker=_VERIFIED_MARKER,
             )
 
             # Check if the verification was successful
-            if "VERIFICATION: CORRECT" in verification:
+            if _VERIFIED_MARKER in verification:
                 print(f"Solution verified as correct after {attempt + 1} attempts.")
                 return current_solution
 
             # Extract the revised solution if available
-            revised_match = re.search(
-                r"REVISED SOLUTION:(.*?)(?=$|VERIFICATION:)", verification, re.DOTALL
-            )
+            revised_solution = MathTools.extract_revised_solution(verification)
 
-            if revised_match:
-                current_solution = revised_match.group(1).strip()
+            if revised_solution:
+                current_solution = revised_solution
                 print(f"Solution revised in attempt {attempt + 1}.")
             else:
                 return f"{current_solution}\n\n===== VERIFICATION NOTES =====\n{verification}"
 
         # Return the best solution after max attempts
         return current_solution
+
+    async def _astream_until(self, chain, inputs: dict, stop_marker: str) -> str:
+        """
+        Stream a chain's output and stop once the marker has been generated.
+
+        The stream is closed as soon as the loop is left, which aborts the
+        remaining generation.
+
+        Args:
+            chain: The chain to stream
+            inputs: The chain inputs
+            stop_marker: Text that ends generation as soon as it is streamed
+
+        Returns:
+            The (possibly truncated) output
+        """
+        content = ""
+        async with aclosing(chain.astream(inputs)) as stream:
+            async for delta in stream:
+                content += delta
+                # The marker can only have been completed by the latest chunk
+                if stop_marker in content[-(len(delta) + len(stop_marker)):]:
+                    break
+        return content
@@ -1,9 +1,10 @@
+from textwrap import dedent
 from langchain_core.prompts import PromptTemplate
 
 
 class MathPromptTemplates:
     # System prompt
-    SYSTEM_PROMPT = """
+    SYSTEM_PROMPT = dedent("""
             You are a mathematical deductive reasoner. You are tasked to solve challenging mathematical problems.
 
             ===== MODELING OF DEDUCTIVE REASONING =====
@@ -31,7 +32,7 @@ class MathPromptTemplates:
             [final answer]
 
             Return final answer within \\boxed{{}}
-            """
+            """).strip()
 
     # Problem format prompt
     PROBLEM_FORMAT = PromptTemplate.from_template(
@@ -39,7 +40,10 @@ class MathPromptTemplates:
     )
 
     # Critic prompt
-    CRITIC_PROMPT = """
+    # Static instructions come first and the round-specific hint last, so every
+    # critique round of a problem shares the same prompt prefix and the
+    # provider's prefix cache can reuse it.
+    CRITIC_PROMPT = dedent("""
             You are a mathematical deductive reasoner with a critical eye. 
             Your task is to analyze a previous solution to a mathematical problem and find alternative approaches.
 
@@ -48,18 +52,20 @@ class MathPromptTemplates:
 
             Be creative, rigorous, and thorough in your reasoning. Show each step clearly.
 
-            ===== PREVIOUS SOLUTION =====
-            {previous_solution}
+            ===== OUTPUT =====
+            Return your final answer within \\boxed{{}}
 
             ===== ORIGINAL PROBLEM =====
             {problem}
 
-            ===== OUTPUT =====
-            Return your final answer within \\boxed{{}}
-            """
+            ===== PREVIOUS SOLUTION =====
+            {previous_solution}
+
+            {round_hint}
+            """).strip()
 
     # Solution prompt
-    SELECTION_PROMPT = """
+    SELECTION_PROMPT = dedent("""
             You are a mathematical solution evaluator. 
             Your task is to analyze multiple proposed solutions to a mathematical problem and select the most reliable one.
                     
@@ -79,10 +85,10 @@ class MathPromptTemplates:
 
             SELECTION:
             Solution [X] is the best.
-            """
+            """).strip()
 
     # Verification prompt
-    VERIFICATION_PROMPT = """
+    VERIFICATION_PROMPT = dedent("""
             You are a rigorous mathematical verification expert. 
             Your task is to verify a proposed solution to a mathematical problem with extreme thoroughness.
                     
@@ -98,23 +104,24 @@ class MathPromptTemplates:
             VERIFICATION PROCESS:
             [Detail your verification steps]
 
-            ISSUES FOUND:
-            [List any issues or errors]
-
             VERIFICATION RESULT:
             [Either "VERIFICATION: CORRECT" or "VERIFICATION: INCORRECT"]
 
+            ISSUES FOUND:
+            [List any issues or errors]
+
             REVISED SOLUTION:
             [If incorrect, provide the corrected solution]
-            """
+            """).strip()
+
 
+_ROUND_HINTS = {
+    1: "The previous solution might contain errors or inefficiencies.",
+    2: "The previous solution is likely flawed or suboptimal. Try a completely different approach.",
+    3: "The previous solution is almost certainly incorrect. Find a different solution method and give a different answer.",
+}
 
-def get_critic_prompt(round_idx):
-    if round_idx == 1:
-        prefix = "The previous solution might contain errors or inefficiencies. "
-    elif round_idx == 2:
-        prefix = "The previous solution is likely flawed or suboptimal. Try a completely different approach. "
-    else:
-        prefix = "The previous solution is almost certainly incorrect. Find a different solution method and give a different answer. "
 
-    return prefix + MathPromptTemplates.CRITIC_PROMPT
+def get_round_hint(round_idx):
+    # Every round other than the first two gets the strongest hint
+    return _ROUND_HINTS.get(round_idx, _ROUND_HINTS[3])
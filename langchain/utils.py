@@ -1,10 +1,29 @@
 import re
 import math
+from functools import lru_cache
 import numpy as np
 from typing import List, Optional
 from langchain_core.tools import BaseTool
 
 
+# The answer phrases as one pattern with a capture group per phrase, ranked in
+# the order they used to be tried
+_ANSWER_RE = re.compile(
+    r"Therefore,?\s*(?:the\s+)?answer\s+is\s*([0-9.]+)"
+    r"|The\s+final\s+answer\s+is\s*([0-9.]+)"
+    r"|(?:Final\s+)?Answer:\s*([0-9.]+)"
+    r"|Hence,?\s*(?:the\s+)?answer\s+is\s*([0-9.]+)"
+    r"|Thus,?\s*(?:the\s+)?answer\s+is\s*([0-9.]+)"
+    r"|\\boxed\{([0-9.]+)\}",
+    re.IGNORECASE,
+)
+_NUMBER_CHARS = "0123456789."
+_REVISED_MARKER = "REVISED SOLUTION:"
+_INCORRECT_MARKER = "VERIFICATION: INCORRECT"
+# Bodies a verifier writes when it has no revision to offer
+_PLACEHOLDER_REVISIONS = {"none", "(none)", "n/a", "na", "-"}
+
+
 class MathTools:
     """Collection of tools for the MathAgent."""
 
@@ -19,27 +38,80 @@ class MathTools:
         Returns:
             Optional[str]: The extracted answer, or None if no answer pattern is found
         """
-        answer_patterns = [
-            r"Therefore,?\s*(?:the\s+)?answer\s+is\s*([0-9.]+)",
-            r"The\s+final\s+answer\s+is\s*([0-9.]+)",
-            r"Answer:\s*([0-9.]+)",
-            r"Final\s+answer:\s*([0-9.]+)",
-            r"Hence,?\s*(?:the\s+)?answer\s+is\s*([0-9.]+)",
-            r"Thus,?\s*(?:the\s+)?answer\s+is\s*([0-9.]+)",
-            r"\\boxed{([0-9.]+)}",
-        ]
+        # Keep the best-ranked phrase, and of that phrase its first occurrence
+        best = None
+        for match in _ANSWER_RE.finditer(solution):
+            rank, answer = next(
+                (rank, group) for rank, group in enumerate(match.groups()) if group is not None
+            )
+            if best is None or rank < best[0]:
+                best = (rank, answer)
+                if rank == 0:
+                    break
+        if best is not None:
+            return best[1]
+
+        # If no pattern matched, take the last number, scanning back from the end
+        end = len(solution)
+        while end and solution[end - 1] not in _NUMBER_CHARS:
+            end -= 1
+        start = end
+        while start and solution[start - 1] in _NUMBER_CHARS:
+            start -= 1
+        return solution[start:end] or None
 
-        for pattern in answer_patterns:
-            match = re.search(pattern, solution, re.IGNORECASE)
-            if match:
-                return match.group(1)
+    @staticmethod
+    def extract_revised_solution(verification_result: str) -> Optional[str]:
+        """
+        Extract the revised solution from a verification response.
 
-        # If no pattern matched, try to find the last number in the solution
-        numbers = re.findall(r"[0-9.]+", solution)
-        if numbers:
-            return numbers[-1]
+        Args:
+            verification_result: The verification response text
 
-        return None
+        Returns:
+            Optional[str]: The revised solution, or None if the solution was not
+            judged incorrect or the revised section is empty or a placeholder
+        """
+        if _INCORRECT_MARKER not in verification_result:
+            return None
+
+        idx = verification_result.rfind(_REVISED_MARKER)
+        if idx == -1:
+            return None
+
+        revised = verification_result[idx + len(_REVISED_MARKER):]
+        revised = revised.partition("VERIFICATION:")[0].strip()
+        # An echoed prompt hint such as "[If incorrect, ...]" is no solution either
+        if (
+            not revised
+            or revised.lower() in _PLACEHOLDER_REVISIONS
+            or (revised.startswith("[") and revised.endswith("]"))
+        ):
+            return None
+        return revised
+
+
+# Names available to calculated expressions, including all math module functions
+_SAFE_GLOBALS = {"__builtins__": {}}
+_SAFE_NAMES = {
+    "abs": abs,
+    "pow": pow,
+    "round": round,
+    "int": int,
+    "float": float,
+    "max": max,
+    "min": min,
+    "sum": sum,
+    "len": len,
+    "math": math,
+    "np": np,
+    **{name: getattr(math, name) for name in dir(math) if not name.startswith("__")},
+}
+
+
+@lru_cache(maxsize=1024)
+def _compile_expression(expression: str):
+    return compile(expression, "<calculate>", "eval")
 
 
 class CalculateTool(BaseTool):
@@ -50,26 +122,9 @@ class CalculateTool(BaseTool):
 
     def _run(self, expression: str) -> str:
         try:
-            safe_dict = {
-                "abs": abs,
-                "pow": pow,
-                "round": round,
-                "int": int,
-                "float": float,
-                "max": max,
-                "min": min,
-                "sum": sum,
-                "len": len,
-                "math": math,
-                "np": np,
-            }
-
-            # Add all math module functions
-            for name in dir(math):
-                if not name.startswith("__"):
-                    safe_dict[name] = getattr(math, name)
-
-            result = eval(expression, {"__builtins__": {}}, safe_dict)
+            # Evaluate with a copy of the names, so an assignment expression
+            # cannot change them for later calls
+            result = eval(_compile_expression(expression), _SAFE_GLOBALS, dict(_SAFE_NAMES))
             return str(result)
         except Exception as e:
             return f"Error in calculation: {str(e)}"
@@ -79,9 +134,14 @@ def get_math_tools() -> List[BaseTool]:
     """
     Get a list of all available math tools.
 
+    The tools are stateless, so every agent shares the same instances.
+
     Returns:
         List[BaseTool]: A list of math tools
     """
-    return [
-        CalculateTool(),
-    ]
+    return list(_MATH_TOOLS)
+
+
+_MATH_TOOLS = (
+    CalculateTool(),
+)
@@ -1,5 +1,6 @@
+import asyncio
 import argparse
-from math_agent import solve_problem
+from math_agent import solve_problem, solve_problems_async
 
 def main():
     parser = argparse.ArgumentParser(description="Math Problem Solver using LangGraph")
@@ -10,9 +11,20 @@ def main():
         default=3, 
         help="Number of reasoning rounds (default: 3)"
     )
+    parser.add_argument(
+        "--problems-file",
+        type=str,
+        help="A file of math problems separated by blank lines, solved concurrently"
+    )
     args = parser.parse_args()
 
-    if args.problem:
+    if args.problems_file:
+        with open(args.problems_file, encoding="utf-8") as f:
+            problems = [p.strip() for p in f.read().split("\n\n") if p.strip()]
+        solutions = asyncio.run(solve_problems_async(problems, num_rounds=args.rounds))
+        for i, (problem, solution) in enumerate(zip(problems, solutions), 1):
+            print(f"\nProblem {i}:\n{problem}\nFinal Solution:\n{solution}")
+    elif args.problem:
         solution = solve_problem(args.problem, num_rounds=args.rounds)
         print(f"\nFinal Solution:\n{solution}")
     else:
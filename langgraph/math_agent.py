@@ -1,6 +1,8 @@
+import asyncio
 from typing import TypedDict, List, Optional
 from langgraph.graph import StateGraph, END
 from nodes import MultiRoundNode, SelectionNode, VerificationNode
+from utils import cache_key, cache_get, cache_set
 
 class AgentState(TypedDict):
     problem: str
@@ -10,6 +12,14 @@ class AgentState(TypedDict):
     verification_status: Optional[str]
     verification_notes: Optional[str]
 
+# Only an answer the workflow trusts is reused by later runs; an unverified one
+# is recomputed
+_CACHED_STATUSES = ("verified", "unanimous")
+
+def route_after_selection(state: AgentState) -> str:
+    """Skip verification when the selection already settled the answer"""
+    return END if state["verification_status"] == "unanimous" else "verification"
+
 def create_math_agent():
     """Create math agent workflow"""
     # Initialize nodes
@@ -27,7 +37,11 @@ def create_math_agent():
 
     # Define edges
     workflow.add_edge("multi_round", "selection")
-    workflow.add_edge("selection", "verification")
+    workflow.add_conditional_edges(
+        "selection",
+        route_after_selection,
+        {"verification": "verification", END: END}
+    )
     workflow.add_edge("verification", END)
 
     # Set entry point
@@ -36,14 +50,13 @@ def create_math_agent():
     # Compile graph
     return workflow.compile()
 
-def solve_problem(problem: str, num_rounds: int = 3):
-    """Run math agent workflow"""
-    if not problem:
-        raise ValueError("Problem cannot be empty")
+# The graph holds no per-problem state, so it is compiled once and shared
+_APP = create_math_agent()
 
-    # Initialize state
-    state = AgentState(
-        problem=problem.strip(),
+def _initial_state(problem: str, num_rounds: int) -> AgentState:
+    """Build the starting state for one problem"""
+    return AgentState(
+        problem=problem,
         num_rounds=num_rounds,
         answer=None,
         answer_list=[],
@@ -51,8 +64,51 @@ def solve_problem(problem: str, num_rounds: int = 3):
         verification_notes=None
     )
 
-    # Create and run workflow
-    app = create_math_agent()
-    result = app.invoke(state)
+def solve_problem(problem: str, num_rounds: int = 3):
+    """Run math agent workflow"""
+    if not problem:
+        raise ValueError("Problem cannot be empty")
+
+    # A problem solved before with the same number of rounds needs no rerun
+    solution_key = cache_key("solve_problem", problem.strip(), num_rounds)
+    cached_answer = cache_get(solution_key)
+    if cached_answer is not None:
+        return cached_answer
 
+    # Run workflow
+    result = _APP.invoke(_initial_state(problem.strip(), num_rounds))
+
+    if result["answer"] is not None and result["verification_status"] in _CACHED_STATUSES:
+        cache_set(solution_key, result["answer"])
     return result["answer"]
+
+async def solve_problems_async(
+    problems: List[str], num_rounds: int = 3, bin_size: int = 8
+) -> List[Optional[str]]:
+    """Run math agent workflow on several problems concurrently"""
+    if not all(problems):
+        raise ValueError("Problem cannot be empty")
+
+    async def solve(problem: str) -> Optional[str]:
+        solution_key = cache_key("solve_problem", problem, num_rounds)
+        cached_answer = cache_get(solution_key)
+        if cached_answer is not None:
+            return cached_answer
+
+        result = await _APP.ainvoke(_initial_state(problem, num_rounds))
+        if result["answer"] is not None and result["verification_status"] in _CACHED_STATUSES:
+            cache_set(solution_key, result["answer"])
+        return result["answer"]
+
+    # Their LLM calls overlap, so the provider can batch them. Problems of
+    # similar length are dispatched together, so a short problem does not
+    # wait behind the decode of a long one in the same batch
+    problems = [problem.strip() for problem in problems]
+    order = sorted(range(len(problems)), key=lambda i: len(problems[i]))
+    answers: List[Optional[str]] = [None] * len(problems)
+    for start in range(0, len(order), bin_size):
+        bin_indices = order[start:start + bin_size]
+        bin_answers = await asyncio.gather(*(solve(problems[i]) for i in bin_indices))
+        for i, answer in zip(bin_indices, bin_answers):
+            answers[i] = answer
+    return answers
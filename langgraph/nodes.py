@@ -1,6 +1,78 @@
+import os
 import re
-from typing import Dict, Any
-from utils import call_llm, extract_final_answer
+import json
+import asyncio
+from textwrap import dedent
+from collections import Counter
+from typing import Dict, Any, List, Optional
+from utils import call_llm, acall_llm, asample_llm, extract_final_answer, has_boxed_answer
+
+# Static system prompt shared by every reasoning round, so the provider can
+# reuse its prefix cache; only the user message changes between calls
+SYSTEM_PROMPT = dedent("""
+    You are a mathematical deductive reasoner. You are tasked to solve challenging mathematical problems.
+
+    ===== MODELING OF DEDUCTIVE REASONING =====
+    You are tasked with understanding a mathematical model based on components 
+    A, B, C, Q, and L. In this model: L: A ⊕ C -> q * B.
+    - A represents the known starting state or given information.
+    - B represents the target state or what we want to prove/find.
+    - C represents the conditions and mathematical rules required to transition from A to B.
+    - Q represents the quality or effectiveness of the transition from A to B.
+    - L represents the logical path or proof process from A to B.
+
+    When solving a mathematical problem:
+    1. Clearly identify A (the given information).
+    2. Clearly identify B (what we want to prove or find).
+    3. Determine C (the mathematical rules, theorems, and conditions needed).
+    4. Construct L (the logical path or proof) step by step.
+    5. Evaluate Q (the effectiveness of your solution).
+
+    Please return the answer within \\boxed{}.
+""").strip()
+
+# Per-phase sampling settings. A first solve and a refinement are both full
+# solutions, so they share a budget large enough to reach the boxed answer;
+# MATHAGENT_SOLVE_MAX_TOKENS overrides it. Selection only names a solution.
+# Verification first asks for a bare JSON verdict, and only leaves room for a
+# fix when one is needed.
+_SOLVE_MAX_TOKENS = int(os.environ.get("MATHAGENT_SOLVE_MAX_TOKENS", "8192"))
+_SOLVE_PARAMS = {"max_tokens": _SOLVE_MAX_TOKENS, "temperature": 0.2}
+_REFINE_PARAMS = {"max_tokens": _SOLVE_MAX_TOKENS, "temperature": 0.7}
+_SELECT_PARAMS = {"max_tokens": 64, "temperature": 0.0}
+_VERIFY_PARAMS = {
+    "max_tokens": 16,
+    "temperature": 0.0,
+    "response_format": {"type": "json_object"},
+}
+_FIX_PARAMS = dict(_VERIFY_PARAMS, max_tokens=256)
+
+_MULTI_ROUND_BANNER = '=' * 10 + 'Multi-round reasoning' + '=' * 10
+_SELECTING_BANNER = '=' * 10 + 'Selecting' + '=' * 10
+_VERIFYING_BANNER = '=' * 10 + 'Verifying' + '=' * 10
+# The full state is only printed on request, since it holds every round's answer
+_DEBUG = bool(os.environ.get("MATHAGENT_DEBUG"))
+
+def _parse_verdict(response: str) -> Optional[Dict[str, Any]]:
+    """Parse a verifier reply into a dict, or None if it holds no JSON object"""
+    # The object runs from the first opening brace to the last closing one;
+    # slicing there avoids a DOTALL regex over the whole reply
+    start = response.find("{")
+    end = response.rfind("}")
+    if start == -1 or end < start:
+        return None
+    try:
+        verdict = json.loads(response[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+    return verdict if isinstance(verdict, dict) else None
+
+def _verify_answer(prompt: str) -> Dict[str, Any]:
+    """Get a verdict, asking again with a larger cap if the fix was cut off"""
+    verdict = _parse_verdict(call_llm(prompt, **_VERIFY_PARAMS))
+    if verdict is None or (not verdict.get("ok") and "fix" not in verdict):
+        verdict = _parse_verdict(call_llm(prompt, **_FIX_PARAMS))
+    return verdict or {}
 
 class MultiRoundNode:
     """Multi-round reasoning node"""
@@ -8,66 +80,65 @@ class MultiRoundNode:
     def run(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """Execute multi-round reasoning"""
         
-        print('=' * 10 + 'Multi-round reasoning' + '=' * 10)
+        print(_MULTI_ROUND_BANNER)
         
         problem = state["problem"]
         num_rounds = state["num_rounds"]
-        answer_list = []
-        prev_answer = None
-        
-        for round_idx in range(num_rounds):
-            if round_idx == 0:
-                prompt = f"""
-                You are a mathematical deductive reasoner. You are tasked to solve challenging mathematical problems.
-                
-                ===== MODELING OF DEDUCTIVE REASONING =====
-                You are tasked with understanding a mathematical model based on components 
-                A, B, C, Q, and L. In this model: L: A ⊕ C -> q * B.
-                - A represents the known starting state or given information.
-                - B represents the target state or what we want to prove/find.
-                - C represents the conditions and mathematical rules required to transition from A to B.
-                - Q represents the quality or effectiveness of the transition from A to B.
-                - L represents the logical path or proof process from A to B.
-
-                When solving a mathematical problem:
-                1. Clearly identify A (the given information).
-                2. Clearly identify B (what we want to prove or find).
-                3. Determine C (the mathematical rules, theorems, and conditions needed).
-                4. Construct L (the logical path or proof) step by step.
-                5. Evaluate Q (the effectiveness of your solution).
-                
-                The problem is: 
-                
-                {problem}
-                
-                Please return the answer within \\boxed{{}}."""
-            else:
-                prompt = f"""Re-examine the following math problem and analyze the previous solution:
-                
-                Problem: {problem}
-                Previous solution: {prev_answer}
-                
-                Please provide an improved solution and return within \\boxed{{}}"""
-                
-            response = call_llm(prompt)            
-            final_answer = extract_final_answer(response)
-            answer_list.append(final_answer)
-            prev_answer = final_answer
-            
+        answer_list = asyncio.run(self._arun(problem, num_rounds))
+
         return {
             "answer_list": answer_list,
             "problem": problem,
             "num_rounds": num_rounds
         }
 
+    async def _arun(self, problem: str, num_rounds: int) -> List[str]:
+        """Run the first round, then the improvement rounds concurrently"""
+
+        prompt = f"The problem is:\n\n{problem}"
+
+        response = await acall_llm(
+            prompt, system=SYSTEM_PROMPT, early_stop=has_boxed_answer, **_SOLVE_PARAMS
+        )
+        answer_list = [extract_final_answer(response)]
+
+        # Every later round improves on the first answer with the same prompt,
+        # so the rounds are drawn as samples of it
+        if num_rounds > 1:
+            # The first exchange is resent as history, so the provider reuses its
+            # prefill and the model sees its full previous solution. A first
+            # solution cut off by the token cap is left out, and the later
+            # rounds solve the problem afresh
+            history = prompt if not response else [
+                {"role": "user", "content": prompt},
+                {"role": "assistant", "content": response},
+                {
+                    "role": "user",
+                    "content": "Re-examine the problem and analyze your previous solution. "
+                    "Please provide an improved solution and return within \\boxed{}"
+                },
+            ]
+
+            responses = await asample_llm(
+                history,
+                system=SYSTEM_PROMPT,
+                n=num_rounds - 1,
+                early_stop=has_boxed_answer,
+                **_REFINE_PARAMS
+            )
+            answer_list += [extract_final_answer(response) for response in responses]
+
+        return answer_list
+
 class SelectionNode:
     """Solution selection node"""
     
     def run(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """Select the best solution from multiple rounds"""
         
-        print('=' * 10 + 'Selecting' + '=' * 10)
-        print('Current state: \n', state)
+        print(_SELECTING_BANNER)
+        if _DEBUG:
+            print('Current state: \n', state)
         
         problem = state["problem"]
         answer_list = state["answer_list"]
@@ -75,6 +146,19 @@ class SelectionNode:
         if len(answer_list) <= 1:
             return {"answer": answer_list[0] if answer_list else None}
             
+        # When every round reached the same answer, verification is skipped
+        if answer_list[0] and answer_list.count(answer_list[0]) == len(answer_list):
+            return {
+                "answer": answer_list[0],
+                "verification_status": "unanimous",
+                "verification_notes": "All rounds reached the same answer"
+            }
+
+        # A unique most common answer wins the vote without an LLM call
+        counts = Counter(answer for answer in answer_list if answer).most_common(2)
+        if counts and (len(counts) == 1 or counts[0][1] > counts[1][1]):
+            return {"answer": counts[0][0]}
+
         formatted_answers = "\n\n".join(
             [f"Solution {i + 1}:\n{sol}" for i, sol in enumerate(answer_list)]
         )
@@ -88,7 +172,7 @@ class SelectionNode:
         Compare solutions based on accuracy and completeness.
         Respond in format: "Best solution is: Solution [number]" """
         
-        response = call_llm(prompt)
+        response = call_llm(prompt, **_SELECT_PARAMS)
         match = re.search(r"Solution\s*(\d+)", response)
         
         if match:
@@ -107,7 +191,7 @@ class VerificationNode:
     def run(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """Verify the selected solution"""
         
-        print('=' * 10 + 'Verifying' + '=' * 10)
+        print(_VERIFYING_BANNER)
         
         problem = state["problem"]
         answer = state["answer"]
@@ -118,24 +202,23 @@ class VerificationNode:
             Problem: {problem}
             Solution: {answer}
             
-            Check each step of the solution. If errors are found, provide a corrected solution.
+            Check each step of the solution. If errors are found, provide a corrected answer.
             
-            Response format:
-            - If correct: "Verification: CORRECT"
-            - If incorrect: "Verification: INCORRECT\nCorrected solution: [corrected solution]" """
+            Respond with exactly one line of JSON:
+            - If correct: {{"ok": true}}
+            - If incorrect: {{"ok": false, "fix": "[corrected answer]"}}"""
             
-            response = call_llm(prompt)
+            verdict = _verify_answer(prompt)
             
-            if "Verification: CORRECT" in response:
+            if verdict.get("ok") is True:
                 return {
                     "answer": answer,
                     "verification_status": "verified",
                     "verification_notes": "Answer verified as correct"
                 }
             
-            revised_match = re.search(r"Corrected solution[:：]\s*(.+)", response, re.DOTALL)
-            if revised_match:
-                answer = revised_match.group(1).strip()
+            if verdict.get("fix"):
+                answer = str(verdict["fix"]).strip()
                 continue
                 
         return {
@@ -1,39 +1,288 @@
 import os
 import re
+import asyncio
+import hashlib
+import functools
+import httpx
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Union
 from openai import OpenAI
 from dotenv import load_dotenv
 
-def call_llm(prompt: str) -> str:
-    load_dotenv(override=True)
-    client = OpenAI(
+# One group per answer phrase, in priority order. "Final answer:" ranks with
+# "Answer:", which always matched inside it when the phrases were tried in turn.
+_ANSWER_RE = re.compile(
+    r"Therefore,?\s*(?:the\s+)?answer\s+is\s*([0-9.]+)"
+    r"|The\s+final\s+answer\s+is\s*([0-9.]+)"
+    r"|(?:Final\s+)?Answer:\s*([0-9.]+)"
+    r"|Hence,?\s*(?:the\s+)?answer\s+is\s*([0-9.]+)"
+    r"|Thus,?\s*(?:the\s+)?answer\s+is\s*([0-9.]+)"
+    r"|\\boxed\{([0-9.]+)\}",
+    re.IGNORECASE,
+)
+_NUMBER_RE = re.compile(r"[0-9.]+")
+_BOXED_OPEN = "\\boxed{"
+
+def has_boxed_answer(text: str) -> bool:
+    """
+    Tell whether the text holds a complete \\boxed{...} answer.
+
+    Passed as early_stop to end a completion once it has given its answer. The
+    braces are counted, so an answer such as \\boxed{\\frac{1}{2}} is only
+    complete at its last closing brace. Every box is checked, so an empty
+    \\boxed{} echoed from the prompt does not count as the answer.
+    """
+    start = text.find(_BOXED_OPEN)
+    while start != -1:
+        body_start = start + len(_BOXED_OPEN)
+        depth = 1
+        for end in range(body_start, len(text)):
+            if text[end] == "{":
+                depth += 1
+            elif text[end] == "}":
+                depth -= 1
+                if depth == 0:
+                    break
+        else:
+            # The last box is still open
+            return False
+        if text[body_start:end].strip():
+            return True
+        start = text.find(_BOXED_OPEN, end)
+    return False
+
+# The cache sits next to this module unless MATHAGENT_CACHE_DIR names another
+# directory, so it does not depend on the working directory of a run
+CACHE_DIR = os.environ.get("MATHAGENT_CACHE_DIR") or Path(__file__).parent / ".llm_cache"
+
+try:
+    import diskcache
+    # Responses persist across runs, so a repeated problem costs no API calls
+    _cache = diskcache.Cache(str(CACHE_DIR))
+except ImportError:
+    # Without diskcache, responses are cached for the current process only
+    _cache = {}
+
+_CACHE_EXPIRE = 7 * 24 * 3600
+MODEL_NAME = "deepseek-chat"
+
+try:
+    import h2  # noqa: F401
+    # Concurrent rounds share one multiplexed connection instead of one each
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+# Load environment variables
+load_dotenv(override=True)
+
+@functools.lru_cache(maxsize=None)
+def _get_client() -> OpenAI:
+    """
+    Create the client on first use and reuse it afterwards, so every call
+    shares the same connection pool. Importing this module needs no API key.
+    """
+    return OpenAI(
         api_key=os.environ.get("DEEPSEEK_API_KEY"),
-        base_url=os.environ.get("DEEPSEEK_API_BASE_URL")
+        base_url=os.environ.get("DEEPSEEK_API_BASE_URL"),
+        max_retries=3,
+        http_client=httpx.Client(
+            http2=_HTTP2,
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=64),
+            timeout=httpx.Timeout(60.0, connect=5.0),
+        ),
+    )
+
+# DeepSeek ignores the n parameter, so several samples per request are only
+# asked for when the endpoint is known to support it, e.g. vLLM or OpenAI
+SUPPORTS_N = os.environ.get("LLM_SUPPORTS_N", "").lower() in ("1", "true")
+
+def cache_key(*parts: Any) -> str:
+    """Build a stable cache key from the given parts"""
+    return hashlib.sha256("\x00".join(map(str, parts)).encode()).hexdigest()
+
+def cache_get(key: str) -> Optional[Any]:
+    """Look up a cached value, returning None on a miss"""
+    return _cache.get(key)
+
+def cache_set(key: str, value: Any) -> None:
+    """Store a value in the cache"""
+    if isinstance(_cache, dict):
+        _cache[key] = value
+    else:
+        _cache.set(key, value, expire=_CACHE_EXPIRE)
+
+def call_llm(
+    prompt: Union[str, List[Dict[str, str]]],
+    system: Optional[str] = None,
+    variant: int = 0,
+    early_stop: Optional[Callable[[str], bool]] = None,
+    **params: Any,
+) -> str:
+    # Extra keyword arguments, such as max_tokens, go to the completion call.
+    # The variant tells apart calls that repeat a prompt to draw different
+    # samples, and a response cut short by early_stop is cached apart from
+    # the full one.
+    key = cache_key(
+        MODEL_NAME,
+        system,
+        prompt,
+        variant,
+        early_stop.__name__ if early_stop else None,
+        sorted(params.items()),
     )
-    response = client.chat.completions.create(
-        model="deepseek-chat",
-        messages=[{"role": "user", "content": prompt}]
+    cached = cache_get(key)
+    if cached is not None:
+        return cached
+
+    content = _stream_completion(_build_messages(prompt, system), 1, early_stop, params)[0]
+    if content:
+        cache_set(key, content)
+    return content
+
+async def acall_llm(
+    prompt: Union[str, List[Dict[str, str]]],
+    system: Optional[str] = None,
+    variant: int = 0,
+    early_stop: Optional[Callable[[str], bool]] = None,
+    **params: Any,
+) -> str:
+    """Call the LLM without blocking the event loop, so several calls can overlap"""
+    return await asyncio.to_thread(call_llm, prompt, system, variant, early_stop, **params)
+
+def sample_llm(
+    prompt: Union[str, List[Dict[str, str]]],
+    system: Optional[str] = None,
+    n: int = 1,
+    early_stop: Optional[Callable[[str], bool]] = None,
+    **params: Any,
+) -> List[str]:
+    """
+    Draw n samples of one prompt.
+
+    When the provider supports the n parameter the samples come from a single
+    request, so the prompt is prefilled once. Otherwise they are separate
+    calls, told apart by their variant.
+    """
+    if n == 1 or not SUPPORTS_N:
+        return [
+            call_llm(prompt, system, variant, early_stop, **params)
+            for variant in range(n)
+        ]
+
+    key = cache_key(
+        MODEL_NAME,
+        system,
+        prompt,
+        "n",
+        n,
+        early_stop.__name__ if early_stop else None,
+        sorted(params.items()),
     )
-    return response.choices[0].message.content
+    cached = cache_get(key)
+    if cached is not None:
+        return cached
+
+    contents = _stream_completion(_build_messages(prompt, system), n, early_stop, params)
+    if all(contents):
+        cache_set(key, contents)
+    return contents
+
+async def asample_llm(
+    prompt: Union[str, List[Dict[str, str]]],
+    system: Optional[str] = None,
+    n: int = 1,
+    early_stop: Optional[Callable[[str], bool]] = None,
+    **params: Any,
+) -> List[str]:
+    """Draw n samples without blocking the event loop"""
+    if n == 1 or not SUPPORTS_N:
+        # Separate calls overlap instead of running one after another
+        return list(
+            await asyncio.gather(
+                *(
+                    acall_llm(prompt, system, variant, early_stop, **params)
+                    for variant in range(n)
+                )
+            )
+        )
+    return await asyncio.to_thread(sample_llm, prompt, system, n, early_stop, **params)
+
+def _stream_completion(
+    messages: List[Dict[str, str]],
+    n: int,
+    early_stop: Optional[Callable[[str], bool]],
+    params: Dict[str, Any],
+) -> List[str]:
+    """
+    Stream n completions of the messages, stopping once early_stop accepts each.
+
+    A completion cut off by max_tokens is returned empty, since any number
+    scraped from its unfinished text would be a spurious answer.
+    """
+    if n > 1:
+        params = dict(params, n=n)
+
+    contents = [""] * n
+    stopped = set()
+    truncated = set()
+    with _get_client().chat.completions.create(
+        model=MODEL_NAME,
+        messages=messages,
+        stream=True,
+        **params
+    ) as stream:
+        for chunk in stream:
+            for choice in chunk.choices:
+                # A completion that has given its answer may keep streaming
+                # while the others finish, but the rest of it is dropped
+                if choice.index in stopped:
+                    continue
+                delta = choice.delta.content or ""
+                contents[choice.index] += delta
+                # Only a delta closing a brace can complete a \boxed{} answer,
+                # so the text is rescanned then
+                if early_stop and "}" in delta and early_stop(contents[choice.index]):
+                    stopped.add(choice.index)
+                if choice.finish_reason == "length":
+                    truncated.add(choice.index)
+            # Leaving the block closes the connection, so the server stops
+            # decoding the rest of the responses
+            if early_stop and len(stopped) == n:
+                break
+    return ["" if index in truncated else content for index, content in enumerate(contents)]
+
+def _build_messages(
+    prompt: Union[str, List[Dict[str, str]]], system: Optional[str] = None
+) -> List[Dict[str, str]]:
+    """
+    Build the chat messages, with the static system prompt first.
+
+    The prompt is either one user message or the conversation so far, so a
+    follow-up call resends the earlier turns as a prefix the provider has cached.
+    """
+    if isinstance(prompt, str):
+        messages = [{"role": "user", "content": prompt}]
+    else:
+        messages = list(prompt)
+    if system:
+        messages.insert(0, {"role": "system", "content": system})
+    return messages
 
 def extract_final_answer(solution: str) -> str:
     """Extract final answer from LLM response"""
-    answer_patterns = [
-        r"Therefore,?\s*(?:the\s+)?answer\s+is\s*([0-9.]+)",
-        r"The\s+final\s+answer\s+is\s*([0-9.]+)",
-        r"Answer:\s*([0-9.]+)",
-        r"Final\s+answer:\s*([0-9.]+)",
-        r"Hence,?\s*(?:the\s+)?answer\s+is\s*([0-9.]+)",
-        r"Thus,?\s*(?:the\s+)?answer\s+is\s*([0-9.]+)",
-        r"\\boxed{([0-9.]+)}",
-    ]
-
-    for pattern in answer_patterns:
-        match = re.search(pattern, solution, re.IGNORECASE)
-        if match:
-            return match.group(1)
+    # Groups are numbered by priority; the best-ranked phrase wins, not the
+    # earliest one in the text
+    best = None
+    for match in _ANSWER_RE.finditer(solution):
+        rank = next(i for i, group in enumerate(match.groups()) if group is not None)
+        if best is None or rank < best[0]:
+            best = (rank, match.group(rank + 1))
+    if best:
+        return best[1]
 
     # Fallback: find last number in response
-    numbers = re.findall(r"[0-9.]+", solution)
+    numbers = _NUMBER_RE.findall(solution)
     return numbers[-1] if numbers else solution
 
 if __name__ == "__main__":
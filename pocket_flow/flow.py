@@ -1,5 +1,11 @@
-from pocketflow import Flow
+import asyncio
+from pocketflow import Flow, Node
 from nodes import MultiRound, Selection, Verification
+from utils import cache_key, cache_get, cache_set
+
+# Only an answer the flow trusts is reused by later runs; an unverified one is
+# recomputed
+_CACHED_STATUSES = ("verified", "unanimous")
 
 def create_math_flow():
     """Create and configure the problem solving workflow
@@ -15,14 +21,20 @@ def create_math_flow():
     selection = Selection()
     verification = Verification()
     
-    # Connect nodes
+    # Connect nodes. Selection returns "skip" when every round agreed; an empty
+    # node then ends the flow without verification
     multi_round >> selection >> verification
+    selection - "skip" >> Node()
     
     # Create flow starting with multi_round node
     math_flow = Flow(start=multi_round)
     
     return math_flow
 
+# Each run works on its own shared dict and copies of the nodes, so one flow
+# can serve every problem
+_FLOW = create_math_flow()
+
 def solve_problem(problem, num_rounds=3):
     """Run the problem solving workflow
     
@@ -40,6 +52,13 @@ def solve_problem(problem, num_rounds=3):
         raise ValueError("Problem cannot be empty")
         
     problem = str(problem).strip()
+
+    # A problem solved before with the same number of rounds needs no rerun
+    solution_key = cache_key("solve_problem", problem, num_rounds)
+    cached_solution = cache_get(solution_key)
+    if cached_solution is not None:
+        return cached_solution
+
     answer = None
     answer_list = []
     
@@ -51,11 +70,43 @@ def solve_problem(problem, num_rounds=3):
         "answer_list": answer_list
     }
     
-    # Create and run flow
-    flow = create_math_flow()
-    flow.run(shared)
+    # Run flow
+    _FLOW.run(shared)
     
     solution = shared["answer"]
+    if solution is not None and shared.get("verification_status") in _CACHED_STATUSES:
+        cache_set(solution_key, solution)
     
     return solution
 
+async def solve_problems_async(problems, num_rounds=3, bin_size=8):
+    """Run the problem solving workflow on several problems concurrently
+    
+    Args:
+        problems (list[str]): The math problems to solve
+        num_rounds (int): Number of reasoning rounds (default: 3)
+        bin_size (int): Number of problems of similar length run together (default: 8)
+        
+    Returns:
+        list[str]: The final solutions, in the order of the problems
+        
+    Raises:
+        ValueError: If any problem is empty or invalid
+    """
+    if not all(problems):
+        raise ValueError("Problem cannot be empty")
+
+    # Problems of similar length are dispatched together, so a short problem
+    # does not wait behind the decode of a long one in the same batch
+    order = sorted(range(len(problems)), key=lambda i: len(str(problems[i]).strip()))
+    solutions = [None] * len(problems)
+    for start in range(0, len(order), bin_size):
+        bin_indices = order[start:start + bin_size]
+        # PocketFlow nodes are synchronous, so each flow runs in its own thread
+        # and the LLM calls of the bin overlap
+        bin_solutions = await asyncio.gather(
+            *(asyncio.to_thread(solve_problem, problems[i], num_rounds) for i in bin_indices)
+        )
+        for i, solution in zip(bin_indices, bin_solutions):
+            solutions[i] = solution
+    return solutions
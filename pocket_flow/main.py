@@ -1,5 +1,6 @@
+import asyncio
 import argparse
-from flow import solve_problem
+from flow import solve_problem, solve_problems_async
 
 def main():
     parser = argparse.ArgumentParser(description="Math Problem Solver using PocketFlow")
@@ -10,24 +11,35 @@ def main():
         default=3, 
         help="Number of reasoning rounds (default: 3)"
     )
+    parser.add_argument(
+        "--problems-file",
+        type=str,
+        help="A file of math problems separated by blank lines, solved concurrently"
+    )
     args = parser.parse_args()
 
-    if args.problem:
+    if args.problems_file:
+        with open(args.problems_file, encoding="utf-8") as f:
+            problems = [p.strip() for p in f.read().split("\n\n") if p.strip()]
+        solutions = asyncio.run(solve_problems_async(problems, num_rounds=args.rounds))
+        for i, (problem, solution) in enumerate(zip(problems, solutions), 1):
+            print(f"\nProblem {i}:\n{problem}\nFinal Solution:\n{solution}")
+    elif args.problem:
         solution = solve_problem(args.problem, num_rounds=args.rounds)
         print(f"\nFinal Solution:\n{solution}")
     else:
-        print("Problem cannot be empty")
-
-if __name__ == "__main__":
-    problem = """
+        problem = """
 Find all real solutions to the equation:  
 \[ \sqrt{x + 3} + \sqrt{x - 2} = 5 \].
 """
 
-    print("=" * 70)
-    print("MathReasonerAgent usage examples")
-    print("=" * 70)
-    
-    print(f"\nExample: {problem}")
-    answer = solve_problem(problem)
-    print(f"Answer: {answer}")
+        print("=" * 70)
+        print("MathReasonerAgent usage examples")
+        print("=" * 70)
+        
+        print(f"\nExample: {problem}")
+        answer = solve_problem(problem)
+        print(f"Answer: {answer}")
+
+if __name__ == "__main__":
+    main()
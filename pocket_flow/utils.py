@@ -1,17 +1,262 @@
 import os
 import re
+import asyncio
+import hashlib
+import functools
+import httpx
+from pathlib import Path
 from openai import OpenAI
 from dotenv import load_dotenv
 
-def call_llm(prompt):    
-    load_dotenv(override=True)
-    client = OpenAI(api_key=os.environ.get("DEEPSEEK_API_KEY"), 
-                    base_url=os.environ.get("DEEPSEEK_API_BASE_URL"))
-    r = client.chat.completions.create(
-        model="deepseek-chat",
-        messages=[{"role": "user", "content": prompt}]
+# Answer phrases, highest priority first, each capturing its own number
+_ANSWER_PATTERN = re.compile(
+    r"Therefore,?\s*(?:the\s+)?answer\s+is\s*([0-9.]+)"
+    r"|The\s+final\s+answer\s+is\s*([0-9.]+)"
+    r"|(?:Final\s+)?Answer:\s*([0-9.]+)"
+    r"|Hence,?\s*(?:the\s+)?answer\s+is\s*([0-9.]+)"
+    r"|Thus,?\s*(?:the\s+)?answer\s+is\s*([0-9.]+)"
+    r"|\\boxed\{([0-9.]+)\}",
+    re.IGNORECASE,
+)
+_NUMBER_PATTERN = re.compile(r"[0-9.]+")
+_BOXED = "\\boxed{"
+
+MODEL_NAME = "deepseek-chat"
+CACHE_DIR = os.environ.get("MATHAGENT_CACHE_DIR") or Path(__file__).parent / ".llm_cache"
+_CACHE_EXPIRE = 7 * 24 * 3600
+# Set LLM_SUPPORTS_N for endpoints that honour n (vLLM, OpenAI); DeepSeek does not
+SUPPORTS_N = os.environ.get("LLM_SUPPORTS_N", "").lower() in ("1", "true")
+
+try:
+    import diskcache
+    _cache = diskcache.Cache(str(CACHE_DIR))
+except ImportError:
+    _cache = {}
+
+try:
+    import h2  # noqa: F401
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+load_dotenv(override=True)
+
+def has_boxed_answer(text):
+    """
+    Check if the text contains a finished, non-empty \\boxed{...} answer.
+
+    Args:
+        text: The text streamed so far
+
+    Returns:
+        bool: True once a box with a non-empty body has its braces balanced
+    """
+    start = text.find(_BOXED)
+    while start != -1:
+        body = start + len(_BOXED)
+        depth = 1
+        for end in range(body, len(text)):
+            if text[end] == "{":
+                depth += 1
+            elif text[end] == "}":
+                depth -= 1
+                if depth == 0:
+                    break
+        else:
+            return False
+        # An empty box, e.g. echoed from the prompt, is not an answer
+        if text[body:end].strip():
+            return True
+        start = text.find(_BOXED, end)
+    return False
+
+@functools.lru_cache(maxsize=None)
+def _get_client():
+    """
+    Get the shared OpenAI client, created on first use.
+
+    Returns:
+        OpenAI: A client with a pooled (HTTP/2 if available) connection and retries
+    """
+    return OpenAI(
+        api_key=os.environ.get("DEEPSEEK_API_KEY"),
+        base_url=os.environ.get("DEEPSEEK_API_BASE_URL"),
+        max_retries=3,
+        http_client=httpx.Client(
+            http2=_HTTP2,
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=64),
+            timeout=httpx.Timeout(60.0, connect=5.0),
+        ),
     )
-    return r.choices[0].message.content
+
+def cache_key(*parts):
+    """
+    Hash the given parts into a cache key.
+
+    Args:
+        *parts: Values identifying the cached item
+
+    Returns:
+        str: The hex digest
+    """
+    return hashlib.sha256("\x00".join(map(str, parts)).encode()).hexdigest()
+
+def cache_get(key):
+    """
+    Get a cached value.
+
+    Args:
+        key: The cache key
+
+    Returns:
+        The value, or None if it is not cached
+    """
+    return _cache.get(key)
+
+def cache_set(key, value):
+    """
+    Cache a value; on disk it expires after a week.
+
+    Args:
+        key: The cache key
+        value: The value to store
+    """
+    if isinstance(_cache, dict):
+        _cache[key] = value
+    else:
+        _cache.set(key, value, expire=_CACHE_EXPIRE)
+
+def call_llm(prompt, system=None, variant=0, early_stop=None, **params):
+    """
+    Call the LLM, returning a cached response if there is one.
+
+    Args:
+        prompt: The user message, or the list of messages so far
+        system: Optional system prompt
+        variant: Sample number, so repeated calls of one prompt are cached apart
+        early_stop: Optional check that ends the stream once it returns True
+        **params: Extra completion arguments, such as max_tokens
+
+    Returns:
+        str: The response, or "" if it was cut off by max_tokens
+    """
+    key = cache_key(
+        MODEL_NAME,
+        system,
+        prompt,
+        variant,
+        early_stop.__name__ if early_stop else None,
+        sorted(params.items()),
+    )
+    cached = cache_get(key)
+    if cached is not None:
+        return cached
+
+    r = _stream_completion(_build_messages(prompt, system), 1, early_stop, params)[0]
+    if r:
+        cache_set(key, r)
+    return r
+
+async def acall_llm(prompt, system=None, variant=0, early_stop=None, **params):
+    """Async call_llm, run in a thread so several calls can overlap"""
+    return await asyncio.to_thread(call_llm, prompt, system, variant, early_stop, **params)
+
+def sample_llm(prompt, system=None, n=1, early_stop=None, **params):
+    """
+    Draw n samples of one prompt.
+
+    Args:
+        prompt: The user message, or the list of messages so far
+        system: Optional system prompt
+        n: Number of samples; one request when SUPPORTS_N, else n calls
+        early_stop: Optional check that ends each sample once it returns True
+        **params: Extra completion arguments, such as max_tokens
+
+    Returns:
+        list[str]: The samples
+    """
+    if n == 1 or not SUPPORTS_N:
+        return [call_llm(prompt, system, i, early_stop, **params) for i in range(n)]
+
+    key = cache_key(
+        MODEL_NAME,
+        system,
+        prompt,
+        "n",
+        n,
+        early_stop.__name__ if early_stop else None,
+        sorted(params.items()),
+    )
+    cached = cache_get(key)
+    if cached is not None:
+        return cached
+
+    samples = _stream_completion(_build_messages(prompt, system), n, early_stop, params)
+    if all(samples):
+        cache_set(key, samples)
+    return samples
+
+async def asample_llm(prompt, system=None, n=1, early_stop=None, **params):
+    """Async sample_llm; separate calls are gathered instead of run in turn"""
+    if n == 1 or not SUPPORTS_N:
+        return list(await asyncio.gather(
+            *(acall_llm(prompt, system, i, early_stop, **params) for i in range(n))
+        ))
+    return await asyncio.to_thread(sample_llm, prompt, system, n, early_stop, **params)
+
+def _stream_completion(messages, n, early_stop, params):
+    """
+    Stream n completions, closing the stream once early_stop accepts all of them.
+
+    Args:
+        messages: The chat messages
+        n: Number of completions
+        early_stop: Optional check on a completion's text so far
+        params: Extra completion arguments
+
+    Returns:
+        list[str]: The completions; one cut off by max_tokens is returned as ""
+    """
+    if n > 1:
+        params = dict(params, n=n)
+
+    texts = [""] * n
+    done = set()
+    cut_off = set()
+    with _get_client().chat.completions.create(
+        model=MODEL_NAME, messages=messages, stream=True, **params
+    ) as stream:
+        for chunk in stream:
+            for choice in chunk.choices:
+                i = choice.index
+                if i in done:
+                    continue
+                delta = choice.delta.content or ""
+                texts[i] += delta
+                # A box can only be closed by a delta holding "}"
+                if early_stop and "}" in delta and early_stop(texts[i]):
+                    done.add(i)
+                if choice.finish_reason == "length":
+                    cut_off.add(i)
+            if early_stop and len(done) == n:
+                break
+    return ["" if i in cut_off else text for i, text in enumerate(texts)]
+
+def _build_messages(prompt, system=None):
+    """
+    Build the chat messages.
+
+    Args:
+        prompt: The user message, or the list of messages so far
+        system: Optional system prompt, put first
+
+    Returns:
+        list[dict]: The messages
+    """
+    messages = [{"role": "user", "content": prompt}] if isinstance(prompt, str) else list(prompt)
+    if system:
+        messages.insert(0, {"role": "system", "content": system})
+    return messages
 
 def extract_final_answer(solution):
     """
@@ -23,23 +268,17 @@ def extract_final_answer(solution):
     Returns:
         Optional[str]: The extracted answer, or None if no answer pattern is found
     """
-    answer_patterns = [
-        r"Therefore,?\s*(?:the\s+)?answer\s+is\s*([0-9.]+)",
-        r"The\s+final\s+answer\s+is\s*([0-9.]+)",
-        r"Answer:\s*([0-9.]+)",
-        r"Final\s+answer:\s*([0-9.]+)",
-        r"Hence,?\s*(?:the\s+)?answer\s+is\s*([0-9.]+)",
-        r"Thus,?\s*(?:the\s+)?answer\s+is\s*([0-9.]+)",
-        r"\\boxed{([0-9.]+)}",
-    ]
-
-    for pattern in answer_patterns:
-        match = re.search(pattern, solution, re.IGNORECASE)
-        if match:
-            return match.group(1)
+    # Take the first occurrence of the highest-priority phrase
+    best_rank, answer = None, None
+    for match in _ANSWER_PATTERN.finditer(solution):
+        rank = next(i for i, group in enumerate(match.groups()) if group is not None)
+        if best_rank is None or rank < best_rank:
+            best_rank, answer = rank, match.group(rank + 1)
+    if answer is not None:
+        return answer
 
     # If no pattern matched, try to find the last number in the solution
-    numbers = re.findall(r"[0-9.]+", solution)
+    numbers = _NUMBER_PATTERN.findall(solution)
     if numbers:
         return numbers[-1]
 
@@ -47,4 +286,4 @@ def extract_final_answer(solution):
 
 # Example usage
 if __name__ == "__main__":
-    print(call_llm("Tell me a short joke")) 
\ No newline at end of file
+    print(call_llm("Tell me a short joke"))